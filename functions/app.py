@@ -1,6 +1,14 @@
 import os
 import io
+import re
+import hashlib
+import zlib
+import time
 import uuid
+import threading
+import queue
+import json
+import random
 import urllib.parse
 import smtplib
 from email.mime.text import MIMEText
@@ -9,7 +17,7 @@ from dotenv import load_dotenv
 load_dotenv() # Load environment variables from .env
 
 # import pandas as pd # Moved inside function
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_file, make_response
+from flask import Flask, Response, g, render_template, request, jsonify, session, redirect, url_for, send_file, make_response
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
@@ -73,23 +81,37 @@ def get_bucket():
     return _bucket
 
 # --- [유틸리티 함수] ---
-def upload_file_to_storage(file, user_id, user_name, apply_type):
+UPLOAD_MAX_WORKERS = 4
+
+def upload_file_to_storage(file, user_id, user_name, apply_type, ref=None):
     """Firebase Storage에 파일을 업로드하고 다운로드 URL을 반환합니다. 
-    이미지 파일인 경우 자동으로 크기를 줄여서 업로드합니다."""
+    이미지 파일인 경우 자동으로 크기를 줄여서 업로드합니다.
+    파일은 원본 내용의 SHA-256 해시로 저장되며, 이미 같은 내용이 올라가 있으면
+    압축/업로드 없이 기존 URL을 반환합니다. ref(예: 'applications/<app_id>')를 주면
+    attachments 색인에 해당 파일을 사용하는 문서로 기록합니다. 아직 저장되지 않은 문서라면
+    ref 없이 올린 뒤 저장이 끝나고 add_attachment_refs()로 기록해야 합니다."""
     if not file or file.filename == '':
         return ""
     
     try:
-        now_date = datetime.now().strftime('%Y%m%d_%H%M%S')
         original_name = secure_filename(file.filename)
         ext = os.path.splitext(original_name)[1].lower()
-        filename = f"{user_id}_{user_name}_{apply_type or 'unknown'}_{now_date}_{original_name}"
-        
-        bucket = get_bucket()
         
         # 파일 읽기
         file_content = file.read()
         content_type = file.content_type or 'application/octet-stream'
+        content_hash = hashlib.sha256(file_content).hexdigest()
+
+        # 동일한 내용의 파일이 이미 있으면 재사용
+        db = get_db()
+        index_ref = db.collection('attachments').document(content_hash)
+        index_doc = index_ref.get()
+        cached = index_doc.to_dict() if index_doc.exists else {}
+        # 저장소 정리 작업이 이미 지운 객체를 돌려주지 않도록 실제 존재 여부를 확인하고 사용 시각을 남깁니다.
+        # (색인이 그 사이 정리되어 갱신에 실패하면 새로 업로드합니다.)
+        if cached.get('url') and get_bucket().blob(cached.get('path', '')).exists() \
+                and add_attachment_ref(index_ref, ref):
+            return cached['url']
 
         # 이미지 압축 처리 (JPG, JPEG, PNG, WEBP 등)
         if ext in ['.jpg', '.jpeg', '.png', '.webp']:
@@ -111,42 +133,402 @@ def upload_file_to_storage(file, user_id, user_name, apply_type):
                 file_content = img_io.getvalue()
                 content_type = 'image/jpeg'
                 
-                # 확장자가 바뀌었으므로 파일명도 .jpg로 조정
-                if not filename.lower().endswith('.jpg') and not filename.lower().endswith('.jpeg'):
-                    filename = os.path.splitext(filename)[0] + '.jpg'
+                # 확장자가 바뀌었으므로 .jpg로 조정
+                ext = '.jpg'
             except Exception as img_err:
                 print(f"Image compression failed, using original: {img_err}")
         
+        bucket = get_bucket()
+        object_path = f"uploads/{content_hash}{ext}"
+
         # Firebase Storage용 다운로드 토큰 생성 (가장 확실한 다운로드 방법)
         access_token = str(uuid.uuid4())
         
-        blob = bucket.blob(f"uploads/{filename}")
+        blob = bucket.blob(object_path)
         blob.metadata = {"firebaseStorageDownloadTokens": access_token}
         
-        # 파일 업로드
-        blob.upload_from_string(file_content, content_type=content_type)
-        
-        # 메타데이터 업데이트 (토큰 적용)
-        blob.patch()
+        from google.api_core.exceptions import PreconditionFailed
+        try:
+            # 파일 업로드 (같은 경로에 객체가 없을 때만 생성)
+            # 토큰 메타데이터는 업로드 요청에 함께 실리므로 별도 patch() 호출이 필요 없습니다.
+            blob.upload_from_string(file_content, content_type=content_type, if_generation_match=0)
+        except PreconditionFailed:
+            # 동시에 같은 파일이 먼저 업로드된 경우 그 객체의 토큰을 사용
+            blob.reload()
+            tokens = (blob.metadata or {}).get('firebaseStorageDownloadTokens', access_token)
+            access_token = tokens.split(',')[0]
+            if not index_ref.get().exists:
+                # 색인이 없는 기존 객체는 정리 작업이 삭제하는 중일 수 있으므로 같은 토큰으로 다시 써서 세대(generation)를 바꿉니다.
+                # 정리 작업은 목록을 읽을 때의 세대로만 삭제하므로 다시 쓴 객체는 지워지지 않습니다.
+                blob.metadata = {"firebaseStorageDownloadTokens": access_token}
+                blob.upload_from_string(file_content, content_type=content_type)
         
         # 브라우저에서 바로 다운로드되도록 Content-Disposition 설정 (선택 사항)
         # blob.content_disposition = f'attachment; filename="{original_name}"'
         # blob.patch()
 
         # Firebase Storage 표준 다운로드 URL 형식 생성
-        encoded_name = urllib.parse.quote(f"uploads/{filename}", safe='')
+        encoded_name = urllib.parse.quote(object_path, safe='')
         public_url = f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{encoded_name}?alt=media&token={access_token}"
+
+        from firebase_admin import firestore
+        index_ref.set({
+            'refs': firestore.ArrayUnion([ref] if ref else []),
+            'hash': content_hash,
+            'path': object_path,
+            'url': public_url,
+            'content_type': content_type,
+            'size': len(file_content),
+            'original_name': original_name,
+            'uploaded_by': f"{user_id}_{user_name}",
+            'apply_type': apply_type or 'unknown',
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'last_used_at': time.time()
+        }, merge=True)
         
         return public_url
     except Exception as e:
         print(f"Upload Error: {e}")
         return ""
 
+def upload_files_to_storage(files, user_id, user_name, apply_type, ref=None):
+    """여러 파일을 스레드 풀에서 동시에 업로드합니다.
+    입력 순서대로 URL 목록을 반환하며, 빈 파일은 건너뛰고 실패한 파일은 빈 문자열입니다."""
+    from concurrent.futures import ThreadPoolExecutor
+    files = [f for f in files if f and f.filename != '']
+    if not files:
+        return []
+    # 작업 스레드에서 클라이언트가 중복 초기화되지 않도록 미리 생성
+    get_db()
+    get_bucket()
+    upload = lambda f: upload_file_to_storage(f, user_id, user_name, apply_type, ref=ref)
+    if len(files) == 1:
+        return [upload(files[0])]
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_MAX_WORKERS, len(files))) as pool:
+        return list(pool.map(upload, files))
+
+def attachment_hash_from_url(url):
+    """다운로드 URL에서 해시 기반 객체 이름을 추출합니다. 이전 방식(타임스탬프 이름)의 URL이면 None."""
+    m = re.search(r'/o/uploads%2F([0-9a-f]{64})(?:\.|\?)', url or '')
+    return m.group(1) if m else None
+
+def add_attachment_ref(index_ref, ref):
+    """기존 첨부파일 색인에 참조와 마지막 사용 시각을 기록합니다. 색인이 없어졌으면 False를 반환합니다."""
+    from firebase_admin import firestore
+    from google.api_core.exceptions import NotFound
+    changes = {'last_used_at': time.time()}
+    if ref:
+        changes['refs'] = firestore.ArrayUnion([ref])
+    try:
+        index_ref.update(changes)
+        return True
+    except NotFound:
+        return False
+
+def add_attachment_refs(urls, ref):
+    """문서 저장이 끝난 뒤 그 문서가 사용하는 첨부파일들을 attachments 색인에 참조로 기록합니다."""
+    db = get_db()
+    for url in urls:
+        content_hash = attachment_hash_from_url(url)
+        if not content_hash:
+            continue
+        try:
+            add_attachment_ref(db.collection('attachments').document(content_hash), ref)
+        except Exception as e:
+            print(f"Attachment ref add error: {e}")
+
+def release_attachment_ref(url, ref):
+    """문서가 더 이상 해당 첨부파일을 사용하지 않을 때 attachments 색인에서 참조를 제거합니다."""
+    content_hash = attachment_hash_from_url(url)
+    if not content_hash or not ref:
+        return
+    try:
+        from firebase_admin import firestore
+        get_db().collection('attachments').document(content_hash).update({'refs': firestore.ArrayRemove([ref])})
+    except Exception as e:
+        print(f"Attachment ref release error: {e}")
+
+# --- [로그인 시도 제한 (토큰 버킷)] ---
+# 로그인 요청마다 Firestore 읽기가 발생하므로, IP/사번 단위로 시도 횟수를 제한합니다.
+# 기본은 인스턴스 내 메모리 버킷이며, REDIS_URL이 설정되어 있으면 인스턴스 간에 공유합니다.
+# 사무실 NAT처럼 여러 직원이 한 IP를 공유하는 경우가 있어 IP 한도는 넉넉하게 두고,
+# 계정 단위 보호는 사번 버킷이 맡습니다.
+LOGIN_IP_PER_MINUTE = int(os.environ.get('LOGIN_IP_PER_MINUTE', 60))
+LOGIN_IP_BUCKET = (LOGIN_IP_PER_MINUTE, LOGIN_IP_PER_MINUTE / 60)  # (최대 토큰, 초당 충전량)
+LOGIN_USER_BUCKET = (5, 5 / 60)       # 사번당 분당 5회
+UNKNOWN_USER_TTL = 300                # 미등록 사번 부정 캐시 유지 시간(초, Redis 공유 시)
+# Redis가 없으면 인스턴스별 캐시라서 다른 인스턴스의 회원가입/일괄 등록을 알 수 없으므로 짧게 유지합니다.
+UNKNOWN_USER_LOCAL_TTL = 30
+# X-Forwarded-For 중 오른쪽에서 몇 번째 값을 클라이언트 IP로 볼지 (앞단 신뢰 프록시 수, 0이면 헤더 무시)
+# firebase.json에 따라 모든 요청이 Firebase Hosting -> 서비스(Google 프런트엔드) 두 단계를 거치며
+# 각각 한 번씩 값을 덧붙이므로 기본값은 2입니다. 1로 두면 Hosting 엣지 주소로 묶여 전 직원이 한 버킷을 씁니다.
+# 서비스 URL로 직접 호출하는 배포(Hosting 미사용)라면 TRUSTED_PROXY_HOPS=1로 설정하세요.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 2))
+_RATE_BUCKET_MAX_KEYS = 10000
+
+_rate_buckets = {}
+_rate_lock = threading.Lock()
+_unknown_users = {}
+_redis = None
+_redis_checked = False
+
+_REDIS_TOKEN_BUCKET = """
+local cap = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or cap)
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or now)
+tokens = math.min(cap, tokens + (now - ts) * rate)
+local ok = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  ok = 1
+end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(cap / rate))
+return ok
+"""
+
+def get_redis():
+    """REDIS_URL이 설정되어 있고 redis 패키지가 설치된 경우에만 클라이언트를 반환합니다."""
+    global _redis, _redis_checked
+    if not _redis_checked:
+        _redis_checked = True
+        url = os.environ.get('REDIS_URL')
+        if url:
+            try:
+                import redis
+                _redis = redis.Redis.from_url(url, socket_timeout=0.2)
+            except Exception as e:
+                print(f"Redis unavailable, using in-process rate limit: {e}")
+    return _redis
+
+def take_token(key, capacity, rate):
+    """버킷에서 토큰 하나를 소비합니다. 허용되면 0, 거부되면 재시도까지 남은 초를 반환합니다."""
+    r = get_redis()
+    if r is not None:
+        try:
+            ok = r.eval(_REDIS_TOKEN_BUCKET, 1, f"login_rl:{key}", capacity, rate, time.time())
+            return 0 if ok else int(1 / rate) + 1
+        except Exception as e:
+            print(f"Redis rate limit error, falling back: {e}")
+
+    now = time.monotonic()
+    with _rate_lock:
+        tokens, ts = _rate_buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        if tokens >= 1:
+            _rate_buckets[key] = (tokens - 1, now)
+            wait = 0
+        else:
+            _rate_buckets[key] = (tokens, now)
+            wait = int((1 - tokens) / rate) + 1
+        if len(_rate_buckets) > _RATE_BUCKET_MAX_KEYS:
+            # 가득 찬(=오래 사용되지 않은) 버킷부터 정리합니다.
+            for k in [k for k, (t, last) in _rate_buckets.items() if t + (now - last) * rate >= capacity]:
+                del _rate_buckets[k]
+    return wait
+
+def get_client_ip():
+    # 맨 왼쪽 값은 클라이언트가 임의로 넣을 수 있으므로, 신뢰하는 프록시가 덧붙인 오른쪽 값을 사용합니다.
+    # main.py는 app.request_context()로 직접 디스패치하기 때문에 wsgi_app을 감싸는 ProxyFix는 적용되지 않습니다.
+    hops = [h.strip() for h in request.headers.get('X-Forwarded-For', '').split(',') if h.strip()]
+    if TRUSTED_PROXY_HOPS and len(hops) >= TRUSTED_PROXY_HOPS:
+        return hops[-TRUSTED_PROXY_HOPS]
+    return request.remote_addr or 'unknown'
+
+def check_login_throttle(sid):
+    """IP와 사번 기준으로 로그인 시도를 제한합니다. 제한 시 재시도 대기 초를 반환합니다."""
+    wait = take_token(f"ip:{get_client_ip()}", *LOGIN_IP_BUCKET)
+    if not wait and sid:
+        wait = take_token(f"user:{sid}", *LOGIN_USER_BUCKET)
+    return wait
+
+def is_unknown_user(sid):
+    r = get_redis()
+    if r is not None:
+        try:
+            return bool(r.exists(f"login_unknown:{sid}"))
+        except Exception as e:
+            print(f"Redis negative cache error, falling back: {e}")
+    expires = _unknown_users.get(sid)
+    return bool(expires and expires > time.monotonic())
+
+def remember_unknown_user(sid):
+    r = get_redis()
+    if r is not None:
+        try:
+            r.set(f"login_unknown:{sid}", 1, ex=UNKNOWN_USER_TTL)
+            return
+        except Exception as e:
+            print(f"Redis negative cache error, falling back: {e}")
+    if len(_unknown_users) > _RATE_BUCKET_MAX_KEYS:
+        _unknown_users.clear()
+    _unknown_users[sid] = time.monotonic() + UNKNOWN_USER_LOCAL_TTL
+
+def forget_unknown_user(sid):
+    """회원가입/일괄 등록된 사번을 부정 캐시에서 제거합니다 (Redis 사용 시 모든 인스턴스에 반영)."""
+    _unknown_users.pop(sid, None)
+    r = get_redis()
+    if r is not None:
+        try:
+            r.delete(f"login_unknown:{sid}")
+        except Exception as e:
+            print(f"Redis negative cache error: {e}")
+
+def fetch_login_user(db, sid):
+    """로그인용 사용자 정보를 조회합니다. 미등록 사번은 일정 시간 캐시하여 Firestore 읽기를 생략합니다."""
+    if is_unknown_user(sid):
+        return None
+    user_ref = db.collection('users').document(sid).get()
+    if not user_ref.exists:
+        remember_unknown_user(sid)
+        return None
+    _unknown_users.pop(sid, None)
+    return user_ref.to_dict()
+
+def throttled_message(wait):
+    return f"로그인 시도가 너무 많습니다. {wait}초 후 다시 시도해 주세요."
+
+# --- [응답 압축 (gzip / brotli)] ---
+# after_request 훅은 등록 역순으로 실행되므로, 다른 훅이 헤더를 모두 붙인 뒤 마지막에 압축되도록 가장 먼저 등록합니다.
+# brotli 패키지가 설치되어 있고 브라우저가 지원하면 br, 아니면 gzip을 사용합니다.
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'application/xml', 'image/svg+xml'
+}
+_compression_stats = {}
+_compression_lock = threading.Lock()
+_brotli_module = None
+
+def get_brotli():
+    global _brotli_module
+    if _brotli_module is None:
+        try:
+            import brotli
+            _brotli_module = brotli
+        except ImportError:
+            _brotli_module = False
+    return _brotli_module or None
+
+def choose_encoding():
+    accept = request.accept_encodings
+    if accept['br'] and get_brotli():
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+def make_compressor(encoding):
+    """(process, flush, finish) 함수 묶음을 반환합니다. flush는 스트리밍 응답에서 청크마다 호출합니다."""
+    if encoding == 'br':
+        c = get_brotli().Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        return c.process, c.flush, c.finish
+    c = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31: gzip 헤더 포함
+    return c.compress, (lambda: c.flush(zlib.Z_SYNC_FLUSH)), c.flush
+
+def record_compression(encoding, raw_bytes, out_bytes, cpu_seconds, skipped=False):
+    with _compression_lock:
+        st = _compression_stats.setdefault(encoding, {'responses': 0, 'skipped': 0, 'raw_bytes': 0, 'compressed_bytes': 0, 'cpu_ms': 0.0})
+        if skipped:
+            st['skipped'] += 1
+            return
+        st['responses'] += 1
+        st['raw_bytes'] += raw_bytes
+        st['compressed_bytes'] += out_bytes
+        st['cpu_ms'] += cpu_seconds * 1000
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or request.method == 'HEAD'):
+        return response
+    encoding = choose_encoding()
+    response.vary.add('Accept-Encoding')
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, 'utf-8')
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    started = time.thread_time()
+    process, _, finish = make_compressor(encoding)
+    compressed = process(data) + finish()
+    cpu = time.thread_time() - started
+    if len(compressed) >= len(data):
+        record_compression(encoding, len(data), len(data), cpu, skipped=True)
+        return response
+    record_compression(encoding, len(data), len(compressed), cpu)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers.add('Server-Timing', f'compress;dur={cpu * 1000:.2f};desc="{encoding} {len(data)}->{len(compressed)}"')
+    return response
+
+def _compress_stream(chunks, encoding, charset):
+    process, flush, finish = make_compressor(encoding)
+    raw = out = 0
+    cpu = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            started = time.thread_time()
+            data = process(chunk) + flush()
+            cpu += time.thread_time() - started
+            raw += len(chunk)
+            out += len(data)
+            if data:
+                yield data
+        started = time.thread_time()
+        data = finish()
+        cpu += time.thread_time() - started
+        out += len(data)
+        yield data
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        record_compression(encoding, raw, out, cpu)
+
+@app.route('/admin/metrics/compression')
+def compression_metrics():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error"}), 403
+    with _compression_lock:
+        metrics = {}
+        for encoding, st in _compression_stats.items():
+            metrics[encoding] = dict(st,
+                                     ratio=round(st['compressed_bytes'] / st['raw_bytes'], 4) if st['raw_bytes'] else None,
+                                     avg_cpu_ms=round(st['cpu_ms'] / st['responses'], 3) if st['responses'] else None)
+    return jsonify({"status": "success", "min_size": COMPRESS_MIN_SIZE, "compression": metrics})
+
+# --- [복지 한도 규칙표] ---
+# period: 'year' = 당해 연도, 'half' = 당해 반기(1~6월 / 7~12월), 'month' = 당월
+BENEFIT_LIMITS = [
+    {'key': 'shared', 'name': '통합 한도 (주택/의료비/복지연금)', 'categories': ['주택지원', '의료비지원', '복지연금'], 'period': 'year', 'limit': 4800000},
+    {'key': 'life_welfare_monthly', 'name': '생활복지지원 월 한도', 'categories': ['생활복지지원'], 'period': 'month', 'limit': 100000},
+    {'key': 'life_welfare_yearly', 'name': '생활복지지원 연 한도', 'categories': ['생활복지지원'], 'period': 'year', 'limit': 1200000},
+    {'key': 'cultural', 'name': '근로자가족문화활동비 반기 한도', 'categories': ['근로자가족문화활동비'], 'period': 'half', 'limit': 300000},
+    {'key': 'vaccine', 'name': '정기예방접종 연간 한도', 'categories': ['정기예방접종'], 'period': 'year', 'limit': 150000},
+]
+
+def limit_rule(key):
+    return next(r for r in BENEFIT_LIMITS if r['key'] == key)
+
 # --- [인증 체크 미들웨어] ---
 @app.before_request
 def enforce_login():
     # 로그인이 필요하지 않은 경로들
-    allowed_endpoints = ['login_page', 'login_process', 'signup_page', 'signup_process', 'static', 'get_settings']
+    allowed_endpoints = ['login_page', 'login_process', 'signup_page', 'signup_process', 'static', 'static_asset', 'get_settings']
     
     # 세션에 user_id가 없고, 허용된 경로가 아닌 경우 로그인 페이지로 리다이렉트
     # 루트(/)도 리다이렉트 로직이 있으므로 예외 처리에 추가하거나 아래 route에서 처리
@@ -165,6 +547,196 @@ def add_security_headers(response):
         response.headers['Expires'] = '-1'
     return response
 
+# --- [요청 프로파일링 (관리자 전용, 선택 실행)] ---
+# 관리자가 X-Profile: 1 헤더 또는 ?_profile=1 로 요청하거나, PROFILE_SAMPLE_RATE(0~1) 비율로 샘플링된 요청만
+# cProfile로 측정합니다. 꺼져 있을 때는 헤더/파라미터 확인 외에 아무 작업도 하지 않습니다.
+# 결과(.pstats + 상위 함수 요약 .txt)는 PROFILE_DIR에 저장하거나, PROFILE_STORAGE_PREFIX가 있으면 Storage에 올립니다.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0') or 0)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/lofawell_profiles')
+PROFILE_STORAGE_PREFIX = os.environ.get('PROFILE_STORAGE_PREFIX', '')
+# 비밀번호가 오가는 요청은 샘플링 대상에서 제외합니다.
+PROFILE_SKIP_ENDPOINTS = {'login_page', 'login_process', 'signup_process'}
+
+def profiling_requested():
+    if request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1':
+        return session.get('user_id') == 'admin'
+    return PROFILE_SAMPLE_RATE > 0 and request.endpoint not in PROFILE_SKIP_ENDPOINTS \
+        and random.random() < PROFILE_SAMPLE_RATE
+
+@app.before_request
+def start_profiler():
+    if not profiling_requested():
+        return
+    import cProfile
+    g.profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profiler.enable()
+
+@app.after_request
+def stop_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    try:
+        import pstats
+        elapsed_ms = int((time.perf_counter() - g.pop('profile_started')) * 1000)
+        profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{request.endpoint or 'unknown'}_{elapsed_ms}ms_{uuid.uuid4().hex[:6]}"
+
+        summary = io.StringIO()
+        # 쿼리 값에는 비밀번호 등이 들어 있을 수 있으므로 경로와 파라미터 이름만 남깁니다.
+        query_keys = ','.join(sorted(request.args.keys()))
+        summary.write(f"{request.method} {request.path}{' ?' + query_keys if query_keys else ''} -> {response.status_code} ({elapsed_ms}ms)\n\n")
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stats_path = os.path.join(PROFILE_DIR, f"{profile_id}.pstats")
+        profiler.dump_stats(stats_path)
+        if PROFILE_STORAGE_PREFIX:
+            bucket = get_bucket()
+            prefix = PROFILE_STORAGE_PREFIX.rstrip('/')
+            bucket.blob(f"{prefix}/{profile_id}.pstats").upload_from_filename(stats_path)
+            bucket.blob(f"{prefix}/{profile_id}.txt").upload_from_string(summary.getvalue(), content_type='text/plain; charset=utf-8')
+            os.remove(stats_path)
+        else:
+            with open(os.path.join(PROFILE_DIR, f"{profile_id}.txt"), 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+        response.headers['X-Profile-Id'] = profile_id
+    except Exception as e:
+        print(f"Profile save error: {e}")
+    return response
+
+@app.teardown_request
+def discard_profiler(exc):
+    # 처리되지 않은 예외로 after_request가 건너뛰어지면 프로파일러가 켜진 채로 남아
+    # 이 스레드의 이후 요청까지 모두 측정되므로, 요청 종료 시 항상 끕니다.
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+# --- [트래픽 캡처 (선택 실행)] ---
+# TRAFFIC_CAPTURE_PATH가 설정된 경우에만 요청마다 한 줄씩 JSONL로 기록합니다.
+# 값은 저장하지 않고 필드 이름과 형태(숫자/문자열 길이 등)만 남기며, 비밀번호류는 길이도 남기지 않습니다.
+# 기록된 로그는 replay_traffic.py로 인메모리 저장소를 대상으로 재생할 수 있습니다.
+TRAFFIC_CAPTURE_PATH = os.environ.get('TRAFFIC_CAPTURE_PATH', '')
+CAPTURE_SECRET_FIELDS = {'password', '비밀번호', '새비밀번호', 'account', '계좌번호', 'phone', '전화번호', 'email', '이메일'}
+# 재생 시 동작을 바꾸는 진단용 파라미터 (재생된 요청이 프로파일링되면 측정값이 왜곡됨)
+CAPTURE_SKIP_PARAMS = {'_profile'}
+_capture_lock = threading.Lock()
+
+def _value_shape(key, value):
+    if key in CAPTURE_SECRET_FIELDS:
+        return {'t': 'secret'}
+    v = str(value)
+    if v in ('on', 'off', 'true', 'false'):
+        return {'t': 'flag', 'v': v}
+    if re.fullmatch(r'-?[\d,]+(\.\d+)?', v):
+        return {'t': 'num', 'len': len(v)}
+    return {'t': 'str', 'len': len(v)}
+
+def _file_size(f):
+    try:
+        pos = f.stream.tell()
+        f.stream.seek(0, os.SEEK_END)
+        size = f.stream.tell()
+        f.stream.seek(pos)
+        return size
+    except Exception:
+        return f.content_length or 0
+
+@app.before_request
+def start_capture():
+    if TRAFFIC_CAPTURE_PATH:
+        # 로그인 요청 등에서 세션이 바뀌기 전의 사용자 구분을 기록합니다.
+        user_id = session.get('user_id')
+        g.capture_role = 'admin' if user_id == 'admin' else ('user' if user_id else 'anon')
+        g.capture_started = time.perf_counter()
+
+@app.after_request
+def write_capture(response):
+    started = g.pop('capture_started', None)
+    if started is None:
+        return response
+    try:
+        record = {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'rule': request.url_rule.rule if request.url_rule else None,
+            # 경로 변수 중 신청서 페이지 이름만 남깁니다 (app_id 등 식별자는 제외).
+            'view_args': {k: v for k, v in (request.view_args or {}).items() if k == 'page'},
+            'role': g.pop('capture_role', 'anon'),
+            'query': {k: _value_shape(k, v) for k, v in request.args.items() if k not in CAPTURE_SKIP_PARAMS},
+            'form': {k: _value_shape(k, v) for k, v in request.form.items()},
+            'files': [{'field': field, 'ext': os.path.splitext(f.filename or '')[1].lower(),
+                       'size': _file_size(f)}
+                      for field, f in request.files.items(multi=True) if f and f.filename],
+            'status': response.status_code,
+            'ms': round((time.perf_counter() - started) * 1000, 2),
+            'resp_bytes': response.calculate_content_length()
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with _capture_lock:
+            with open(TRAFFIC_CAPTURE_PATH, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except Exception as e:
+        print(f"Traffic capture error: {e}")
+    return response
+
+# --- [정적 자원 (내용 해시 기반 장기 캐싱)] ---
+# 템플릿에서는 asset_url('css/apply_form.css') 로 참조하면 /assets/css/apply_form.<해시>.css 주소가 만들어집니다.
+# 내용이 바뀌면 주소도 바뀌므로 브라우저/CDN에 1년 immutable 캐시를 허용합니다. (개인정보가 담긴 HTML은 계속 no-store)
+ASSET_MAX_AGE = 365 * 24 * 3600
+_asset_cache = {}
+_asset_lock = threading.Lock()
+
+def load_asset(path):
+    """static 폴더의 파일을 읽어 (해시, 내용, mimetype)을 캐시합니다. 디버그 모드에서는 파일 변경 시 다시 읽습니다."""
+    from werkzeug.security import safe_join
+    import mimetypes
+    full_path = safe_join(app.static_folder, path)
+    if full_path is None or not os.path.isfile(full_path):
+        return None
+    mtime = os.path.getmtime(full_path)
+    with _asset_lock:
+        cached = _asset_cache.get(path)
+        if cached and (cached['mtime'] == mtime or not app.debug):
+            return cached
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        cached = {
+            'hash': hashlib.sha256(data).hexdigest()[:12],
+            'data': data,
+            'mimetype': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            'mtime': mtime
+        }
+        _asset_cache[path] = cached
+        return cached
+
+@app.template_global()
+def asset_url(path):
+    asset = load_asset(path)
+    if asset is None:
+        return url_for('static', filename=path)
+    base, ext = os.path.splitext(path)
+    return url_for('static_asset', filename=f"{base}.{asset['hash']}{ext}")
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    base, ext = os.path.splitext(filename)
+    base, _, requested_hash = base.rpartition('.')
+    asset = load_asset(base + ext) if base else None
+    if asset is None:
+        return "Not Found", 404
+    resp = make_response(asset['data'])
+    resp.mimetype = asset['mimetype']
+    resp.set_etag(asset['hash'])
+    if requested_hash == asset['hash']:
+        resp.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    else:
+        # 배포 직후 이전 해시로 요청된 경우: 최신 내용을 주되 캐시에 고정하지 않음
+        resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
 # --- [1. 로그인 및 세션] ---
 @app.route('/')
 def index():
@@ -185,18 +757,18 @@ def main_page():
     current_year = datetime.now().strftime('%Y')
     current_month = datetime.now().strftime('%Y-%m')
     
-    # 💡 통합 한도 항목 및 개인별 월간 한도 설정
-    shared_categories = ['주택지원', '의료비지원', '복지연금']
-    individual_monthly_limit = 100000
+    # 💡 통합 한도 항목 및 개인별 월간 한도 설정 (BENEFIT_LIMITS 규칙표 참고)
+    shared_categories = limit_rule('shared')['categories']
+    individual_monthly_limit = limit_rule('life_welfare_monthly')['limit']
     
     # 신규: 근로자가족문화활동비 반기 한도 (30만원)
-    cultural_limit = 300000
+    cultural_limit = limit_rule('cultural')['limit']
     cultural_usage = 0
     current_month_int = int(datetime.now().strftime('%m'))
     current_half = 1 if current_month_int <= 6 else 2
 
     # 신규: 정기예방접종 연간 한도 (15만원)
-    vaccine_limit = 150000
+    vaccine_limit = limit_rule('vaccine')['limit']
     vaccine_usage = 0
 
     total_shared_approved = 0
@@ -250,7 +822,7 @@ def main_page():
     return render_template('main.html', 
                            user_name=session['user_name'],
                            used_amount=total_shared_approved,
-                           total_limit=4800000,
+                           total_limit=limit_rule('shared')['limit'],
                            monthly_usage=category_monthly_usage,
                            yearly_usage=category_yearly_usage,
                            monthly_limit=individual_monthly_limit,
@@ -274,11 +846,15 @@ def login_page():
     error_msg = None
     
     if eid and pw:
+        wait = check_login_throttle(eid.strip())
+        if wait:
+            resp = make_response(render_template('login.html', error_msg=throttled_message(wait)), 429)
+            resp.headers['Retry-After'] = str(wait)
+            return resp
         try:
             db = get_db()
-            user_ref = db.collection('users').document(eid.strip()).get()
-            if user_ref.exists:
-                u_info = user_ref.to_dict()
+            u_info = fetch_login_user(db, eid.strip())
+            if u_info is not None:
                 if str(u_info.get('비밀번호', '')).strip() == pw.strip():
                     session.permanent = True
                     session.update({
@@ -310,12 +886,17 @@ def login_process():
     try:
         sid = str(request.form['employeeId']).strip()
         pw = str(request.form['password']).strip()
+
+        wait = check_login_throttle(sid)
+        if wait:
+            resp = jsonify({"status": "error", "message": throttled_message(wait)})
+            resp.headers['Retry-After'] = str(wait)
+            return resp, 429
         
         db = get_db()
-        user_ref = db.collection('users').document(sid).get()
+        u_info = fetch_login_user(db, sid)
         
-        if user_ref.exists:
-            u_info = user_ref.to_dict()
+        if u_info is not None:
             stored_pw = str(u_info.get('비밀번호', '')).strip()
             
             if stored_pw == pw:
@@ -376,6 +957,28 @@ def apply_page(page):
                            edit_mode=edit_mode, 
                            data=data)
 
+def diff_application_fields(stored, new_data):
+    """저장된 신청서와 새 데이터를 비교하여 update()에 넘길 변경 필드만 반환합니다.
+    raw_data는 하위 필드 단위로 비교하여 바뀐 항목만 갱신합니다."""
+    from firebase_admin import firestore
+    changes = {}
+    for key, value in new_data.items():
+        if key != 'raw_data' and stored.get(key) != value:
+            changes[key] = value
+
+    old_raw = stored.get('raw_data')
+    new_raw = new_data.get('raw_data') or {}
+    if not isinstance(old_raw, dict):
+        changes['raw_data'] = new_raw
+        return changes
+    for key in set(old_raw) | set(new_raw):
+        path = firestore.FieldPath('raw_data', key).to_api_repr()
+        if key not in new_raw:
+            changes[path] = firestore.DELETE_FIELD
+        elif old_raw.get(key) != new_raw[key]:
+            changes[path] = new_raw[key]
+    return changes
+
 # --- [3. 신청서 제출] ---
 @app.route('/submit', methods=['GET', 'POST'])
 @app.route('/edit_submit', methods=['POST'])
@@ -434,11 +1037,29 @@ def handle_submit():
         print(f"Form Data: {request.form}")
         print(f"Files: {request.files}")
 
-        file = request.files.get('attachment')
-        file_url = request.form.get('old_filename', '')
+        stored = None
+        if not app_id or app_id == 'None':
+            app_id = str(int(datetime.now().timestamp() * 1000))
+            msg = "신청이 완료되었습니다."
+        else:
+            msg = "수정이 완료되었습니다."
+            # 수정 시에는 저장된 문서와 비교하여 변경된 필드만 update() 합니다.
+            stored_doc = db.collection('applications').document(app_id).get()
+            stored = stored_doc.to_dict() if stored_doc.exists else None
+
+        old_file_url = request.form.get('old_filename', '')
+        old_file_urls = [old_file_url] if old_file_url else []
+        if not old_file_urls and stored:
+            # 새 파일을 올리지 않은 수정은 기존 첨부파일을 그대로 유지
+            old_file_urls = stored.get('attachments') or [u for u in [stored.get('attachment', stored.get('첨부파일', ''))] if u]
+        file_urls = old_file_urls
         
-        if file and file.filename != '':
-            file_url = upload_file_to_storage(file, user_id, user_name, apply_type)
+        files = [f for f in request.files.getlist('attachment') if f and f.filename != '']
+        if files:
+            # 참조(refs)는 신청서 저장이 끝난 뒤에 기록합니다 (저장 전에 실패하면 지울 수 없는 참조가 남음).
+            file_urls = [u for u in upload_files_to_storage(files, user_id, user_name, apply_type) if u]
+        # 기존 화면/엑셀 호환을 위해 첫 번째 파일은 단일 필드에도 저장
+        file_url = file_urls[0] if file_urls else ''
 
         # 모든 폼 데이터를 딕셔너리로 수집
         form_data_all = {}
@@ -457,12 +1078,6 @@ def handle_submit():
         if not clean_detail:
             clean_detail = request.form.get('detail_text', '')
 
-        if not app_id or app_id == 'None':
-            app_id = str(int(datetime.now().timestamp() * 1000))
-            msg = "신청이 완료되었습니다."
-        else:
-            msg = "수정이 완료되었습니다."
-
         new_data = {
             'app_id': app_id,
             'apply_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -480,6 +1095,7 @@ def handle_submit():
             'reject_reason': '',
             'target_name': request.form.get('target_name', ''),
             'attachment': file_url,
+            'attachments': file_urls,
             'raw_data': form_data_all,  # 모든 원본 필드 저장
             # 하위 호환성을 위해 한글 필드도 유지
             '사번': user_id,
@@ -499,7 +1115,19 @@ def handle_submit():
             '반려의견': ''
         }
 
-        db.collection('applications').document(app_id).set(new_data)
+        doc_ref = db.collection('applications').document(app_id)
+        if stored is None:
+            doc_ref.set(new_data)
+        else:
+            changes = diff_application_fields(stored, new_data)
+            if changes:
+                doc_ref.update(changes)
+        if files:
+            add_attachment_refs(file_urls, f"applications/{app_id}")
+        update_search_index(app_id, new_data)
+        for url in old_file_urls:
+            if url not in file_urls:
+                release_attachment_ref(url, f"applications/{app_id}")
         
         return jsonify({"status": "success", "message": msg})
 
@@ -582,14 +1210,33 @@ def cancel_apply():
             
         if action == 'delete':
             doc_ref.delete()
+            update_search_index(app_id)
+            for url in data.get('attachments') or [data.get('attachment', data.get('첨부파일', ''))]:
+                release_attachment_ref(url, f"applications/{app_id}")
             return jsonify({"status": "success", "message": "삭제되었습니다."})
         else:
-            doc_ref.update({'상태': '취소'})
+            doc_ref.update({'status': '취소', '상태': '취소'})
+            update_search_index(app_id, dict(data, status='취소', 상태='취소'))
             return jsonify({"status": "success", "message": "취소되었습니다."})
             
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def normalize_application(d):
+    """영문 필드만 있는 신청서에 관리자 화면/엑셀에서 쓰는 한글 필드를 채워 넣습니다 (하위 호환)."""
+    if '신청일시' not in d and 'apply_date' in d: d['신청일시'] = d['apply_date']
+    if '구분' not in d and 'type' in d: d['구분'] = d['type']
+    if '상태' not in d and 'status' in d: d['상태'] = d['status']
+    if '신청금액' not in d and 'amount' in d: d['신청금액'] = d['amount']
+    if '사번' not in d and 'user_id' in d: d['사번'] = d['user_id']
+    if '성명' not in d and 'user_name' in d: d['성명'] = d['user_name']
+    if '부서' not in d and 'user_dept' in d: d['부서'] = d['user_dept']
+    if '직급' not in d and 'user_rank' in d: d['직급'] = d['user_rank']
+    if '입사일' not in d and 'join_date' in d: d['입사일'] = d['join_date']
+    if '첨부파일' not in d and 'attachment' in d: d['첨부파일'] = d['attachment']
+    if '반려의견' not in d and 'reject_reason' in d: d['반려의견'] = d['reject_reason']
+    return d
+
 @app.route('/admin')
 def admin_dashboard():
     if session.get('user_id') != 'admin': return redirect(url_for('index'))
@@ -601,19 +1248,7 @@ def admin_dashboard():
     docs = db.collection('applications').stream()
     all_apps = []
     for doc in docs:
-        d = doc.to_dict()
-        # 하위 호환성을 위한 데이터 매핑
-        if '신청일시' not in d and 'apply_date' in d: d['신청일시'] = d['apply_date']
-        if '구분' not in d and 'type' in d: d['구분'] = d['type']
-        if '상태' not in d and 'status' in d: d['상태'] = d['status']
-        if '신청금액' not in d and 'amount' in d: d['신청금액'] = d['amount']
-        if '사번' not in d and 'user_id' in d: d['사번'] = d['user_id']
-        if '성명' not in d and 'user_name' in d: d['성명'] = d['user_name']
-        if '부서' not in d and 'user_dept' in d: d['부서'] = d['user_dept']
-        if '직급' not in d and 'user_rank' in d: d['직급'] = d['user_rank']
-        if '입사일' not in d and 'join_date' in d: d['입사일'] = d['join_date']
-        if '첨부파일' not in d and 'attachment' in d: d['첨부파일'] = d['attachment']
-        all_apps.append(d)
+        all_apps.append(normalize_application(doc.to_dict()))
     
     # 최신순 정렬
     all_apps.sort(key=lambda x: x.get('신청일시', ''), reverse=True)
@@ -658,6 +1293,114 @@ def admin_dashboard():
                            pending_list=pending_list,
                            user_name=session['user_name'])
 
+# --- [관리자 대기 목록 실시간 갱신 (SSE)] ---
+# 인스턴스당 하나의 Firestore 스냅샷 리스너로 '대기' 신청서 변경분만 받아,
+# 접속 중인 관리자 화면들에 server-sent events로 나눠 보냅니다.
+SSE_HEARTBEAT_SECONDS = 15
+_pending_lock = threading.Lock()
+_pending_subscribers = set()
+_pending_cache = {}
+_pending_watch = None
+
+def _on_pending_snapshot(doc_snapshots, changes, read_time):
+    with _pending_lock:
+        for change in changes:
+            doc = change.document
+            kind = change.type.name  # ADDED / MODIFIED / REMOVED
+            if kind == 'REMOVED':
+                _pending_cache.pop(doc.id, None)
+                event, row = 'removed', {'app_id': doc.id}
+            else:
+                row = normalize_application(doc.to_dict())
+                row.setdefault('app_id', doc.id)
+                _pending_cache[doc.id] = row
+                event = 'added' if kind == 'ADDED' else 'modified'
+            for q in _pending_subscribers:
+                q.put((event, row))
+
+def _detach_dead_pending_watch():
+    """리스너가 오류로 멈췄으면 떼어내고 반환합니다 (_pending_lock을 잡은 상태에서 호출).
+    파이썬 SDK의 on_snapshot에는 오류 콜백이 없고, 스트림이 끝나면 is_active가 False가 됩니다."""
+    global _pending_watch
+    watch = _pending_watch
+    if watch is None or getattr(watch, 'is_active', True):
+        return None
+    _pending_watch = None
+    _pending_cache.clear()
+    # 멈춰 있던 동안의 변경은 알 수 없으므로 화면 목록을 비우고 새 리스너의 초기 스냅샷으로 다시 채웁니다.
+    for q in _pending_subscribers:
+        q.put(('reset', {}))
+    return watch
+
+def _attach_pending_watch():
+    global _pending_watch
+    if _pending_watch is None:
+        _pending_watch = get_db().collection('applications') \
+            .where('status', '==', '대기') \
+            .on_snapshot(_on_pending_snapshot)
+
+def subscribe_pending():
+    """대기 목록 구독을 시작합니다. 첫 구독자일 때만 리스너를 붙이고, reset 뒤에 현재 목록을 먼저 보내줍니다."""
+    q = queue.Queue()
+    with _pending_lock:
+        dead = _detach_dead_pending_watch()
+        # EventSource 재연결 시 화면에 남아 있는 행 중 그 사이 승인/취소된 것이 있을 수 있으므로
+        # 매 스트림 시작마다 목록을 비우게 한 뒤 현재 목록을 보냅니다.
+        q.put(('reset', {}))
+        for row in _pending_cache.values():
+            q.put(('added', row))
+        _pending_subscribers.add(q)
+        _attach_pending_watch()
+    if dead is not None:
+        dead.unsubscribe()
+    return q
+
+def ensure_pending_watch():
+    """접속 중인 구독자가 있는데 리스너가 멈춰 있으면 다시 붙입니다."""
+    with _pending_lock:
+        dead = _detach_dead_pending_watch()
+        if dead is not None and _pending_subscribers:
+            _attach_pending_watch()
+    if dead is not None:
+        dead.unsubscribe()
+
+def unsubscribe_pending(q):
+    global _pending_watch
+    watch = None
+    with _pending_lock:
+        _pending_subscribers.discard(q)
+        if not _pending_subscribers and _pending_watch is not None:
+            watch, _pending_watch = _pending_watch, None
+            _pending_cache.clear()
+    # 콜백 스레드가 락을 기다리는 중일 수 있으므로 락 밖에서 해제
+    if watch is not None:
+        watch.unsubscribe()
+
+@app.route('/admin/pending/stream')
+def admin_pending_stream():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error"}), 403
+
+    def generate():
+        q = subscribe_pending()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event, row = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    ensure_pending_watch()
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(row, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            unsubscribe_pending(q)
+
+    resp = Response(generate(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 def send_notification_email(to_email, subject, body):
     """지정된 이메일로 알림 메일을 발송합니다."""
     # 💡 보안을 위해 Google 계정의 [앱 비밀번호] 사용을 강력히 권장합니다.
@@ -711,6 +1454,7 @@ def admin_process():
         'reject_reason': reason,
         '반려의견': reason
     })
+    update_search_index(app_id, dict(app_data, status=status, 상태=status, reject_reason=reason, 반려의견=reason))
 
     # 2. 사용자 정보에서 이메일 가져오기 및 알림 발송
     try:
@@ -736,6 +1480,178 @@ def admin_process():
 
     return jsonify({"status": "success"})
 
+# --- [관리자 통합 검색 (인메모리 역색인)] ---
+# 신청서 전체를 한 번 스트리밍해서 역색인을 만들고, TTL 동안 재사용합니다.
+# 신청/수정/승인/삭제 시에는 update_search_index()로 해당 문서만 다시 색인하고,
+# TTL 재구축은 다른 인스턴스에서 일어난 변경을 반영하는 용도로만 사용합니다.
+SEARCH_FIELDS = ['user_name', 'user_id', 'user_dept', 'type', 'detail']
+SEARCH_INDEX_TTL = 60  # 초
+_search_index = None
+_search_index_lock = threading.Lock()    # 색인 조회/수정 (검색 전체를 이 락 안에서 수행)
+_search_build_lock = threading.Lock()    # 전체 재구축은 한 스레드만
+_search_pending = None                   # 재구축 중에 들어온 변경 (app_id -> 문서, 삭제는 None)
+
+def tokenize_search_text(text):
+    """검색용 토큰 집합을 만듭니다.
+    단어 전체와 2글자 n-gram을 함께 색인하여 한글 부분 검색(예: '의료' -> '의료비지원')을 지원합니다."""
+    tokens = set()
+    for word in re.findall(r'\w+', str(text or '').lower()):
+        tokens.add(word)
+        for i in range(len(word) - 1):
+            tokens.add(word[i:i + 2])
+    return tokens
+
+def _search_row(d):
+    """한글/영문 필드가 섞인 신청서 문서를 검색 결과용 dict로 정리합니다."""
+    return {
+        'app_id': d.get('app_id'),
+        'apply_date': d.get('apply_date', d.get('신청일시', '')),
+        'type': d.get('type', d.get('구분', '')),
+        'user_id': str(d.get('user_id', d.get('사번', '')) or ''),
+        'user_name': d.get('user_name', d.get('성명', '')),
+        'user_dept': d.get('user_dept', d.get('부서', '')),
+        'amount': d.get('amount', d.get('신청금액', 0)),
+        'status': d.get('상태', d.get('status', '')),
+        'detail': d.get('detail', d.get('세부내용', ''))
+    }
+
+def build_search_index(db):
+    """applications 컬렉션 스냅샷으로 역색인을 생성합니다."""
+    rows, postings, texts = {}, {}, {}
+    for doc in db.collection('applications').stream():
+        row = _search_row(doc.to_dict())
+        app_id = row['app_id'] or doc.id
+        row['app_id'] = app_id
+        text = ' '.join(str(row.get(f) or '') for f in SEARCH_FIELDS).lower()
+        rows[app_id] = row
+        texts[app_id] = text
+        for token in tokenize_search_text(text):
+            postings.setdefault(token, set()).add(app_id)
+    return {'built_at': time.time(), 'rows': rows, 'texts': texts, 'postings': postings}
+
+def _unindex(index, app_id):
+    text = index['texts'].pop(app_id, None)
+    index['rows'].pop(app_id, None)
+    if text is None:
+        return
+    for token in tokenize_search_text(text):
+        ids = index['postings'].get(token)
+        if ids is not None:
+            ids.discard(app_id)
+            if not ids:
+                del index['postings'][token]
+
+def ensure_search_index():
+    """색인이 없거나 TTL이 지났으면 재구축합니다.
+    컬렉션 전체를 읽는 동안에는 _search_index_lock을 잡지 않으므로 신청/승인 처리가 기다리지 않고,
+    그 사이의 변경은 _search_pending에 모았다가 새 색인에 반영한 뒤 교체합니다.
+    다른 스레드가 재구축 중이면 기존 색인이 있을 때는 그대로 사용하고, 없을 때만 완료를 기다립니다."""
+    global _search_index, _search_pending
+    with _search_index_lock:
+        index = _search_index
+        if index is not None and time.time() - index['built_at'] <= SEARCH_INDEX_TTL:
+            return
+    if not _search_build_lock.acquire(blocking=index is None):
+        return
+    try:
+        with _search_index_lock:
+            if _search_index is not None and _search_index is not index:
+                return  # 기다리는 동안 다른 스레드가 새로 만듦
+            _search_pending = {}
+        fresh = build_search_index(get_db())
+        with _search_index_lock:
+            for app_id, data in _search_pending.items():
+                _apply_search_update(fresh, app_id, data)
+            _search_index = fresh
+    finally:
+        with _search_index_lock:
+            _search_pending = None
+        _search_build_lock.release()
+
+def update_search_index(app_id, data=None):
+    """신청서 한 건의 변경을 색인에 반영합니다. data가 None이면 삭제로 처리합니다.
+    아직 색인이 만들어지지 않았다면 다음 검색에서 전체를 만들기 때문에 기록만 남깁니다."""
+    with _search_index_lock:
+        if _search_pending is not None:
+            _search_pending[app_id] = data
+        if _search_index is not None:
+            _apply_search_update(_search_index, app_id, data)
+
+def _apply_search_update(index, app_id, data):
+    _unindex(index, app_id)
+    if data is not None:
+        row = _search_row(data)
+        row['app_id'] = app_id
+        text = ' '.join(str(row.get(f) or '') for f in SEARCH_FIELDS).lower()
+        index['rows'][app_id] = row
+        index['texts'][app_id] = text
+        for token in tokenize_search_text(text):
+            index['postings'].setdefault(token, set()).add(app_id)
+
+def search_applications(index, query):
+    """검색어의 모든 단어를 포함하는 신청서 ID 목록을 최신순으로 반환합니다."""
+    words = re.findall(r'\w+', str(query or '').lower())
+    if not words:
+        return []
+    postings = index['postings']
+    candidates = None
+    for word in words:
+        if len(word) == 1:
+            # 한 글자 검색은 해당 글자를 포함한 토큰들의 합집합으로 후보를 찾습니다.
+            matched = set()
+            for token, ids in postings.items():
+                if word in token:
+                    matched |= ids
+        else:
+            grams = [word[i:i + 2] for i in range(len(word) - 1)]
+            matched = set(postings.get(grams[0], ()))
+            for g in grams[1:]:
+                matched &= postings.get(g, set())
+                if not matched:
+                    break
+        candidates = matched if candidates is None else candidates & matched
+        if not candidates:
+            return []
+    # n-gram 교집합은 순서를 보장하지 않으므로 원문 포함 여부로 최종 확인합니다.
+    texts = index['texts']
+    hits = [a for a in candidates if all(w in texts[a] for w in words)]
+    rows = index['rows']
+    hits.sort(key=lambda a: rows[a].get('apply_date') or '', reverse=True)
+    return hits
+
+@app.route('/admin/search')
+def admin_search():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error"}), 403
+    started = time.perf_counter()
+    query = request.args.get('q', '').strip()
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+    except ValueError:
+        return jsonify({"status": "error", "message": "page/per_page는 숫자여야 합니다."}), 400
+
+    try:
+        ensure_search_index()
+        # 신청/승인 스레드가 같은 dict/set을 고치므로 검색과 페이지 추출을 락 안에서 끝냅니다.
+        with _search_index_lock:
+            index = _search_index
+            hits = search_applications(index, query)
+            start = (page - 1) * per_page
+            results = [dict(index['rows'][a]) for a in hits[start:start + per_page]]
+        return jsonify({
+            "status": "success",
+            "query": query,
+            "total": len(hits),
+            "page": page,
+            "per_page": per_page,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2)
+        })
+    except Exception as e:
+        print(f"Search Error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 # --- [직원 정보 관리 API] ---
 @app.route('/api/users')
 def api_users():
@@ -780,6 +1696,578 @@ def admin_user_delete():
     db.collection('users').document(user_id).delete()
     return jsonify({"status": "success"})
 
+# --- [저장소 정리 (고아 첨부파일 삭제)] ---
+SWEEP_GRACE_DAYS = 7
+SWEEP_PAGE_SIZE = 500
+SWEEP_DELETE_WORKERS = 8
+
+def select_paths(names):
+    """select()에 넘길 필드 경로 목록을 만듭니다. 한글 필드명은 백틱으로 감싸야 Firestore가 받아들입니다."""
+    from firebase_admin import firestore
+    return [firestore.FieldPath(name).to_api_repr() for name in names]
+
+def stream_in_pages(query, fields, page_size=SWEEP_PAGE_SIZE):
+    """필요한 필드만 선택하여 문서를 페이지 단위로 읽어옵니다 (대용량 컬렉션 메모리 절약)."""
+    base = query.select(fields).order_by('__name__').limit(page_size)
+    last = None
+    while True:
+        page = (base.start_after(last) if last is not None else base).get()
+        for doc in page:
+            yield doc
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+def storage_path_from_url(url):
+    """Firebase Storage 다운로드 URL에서 객체 경로(uploads/...)를 추출합니다."""
+    m = re.search(r'/o/([^?]+)', url or '')
+    return urllib.parse.unquote(m.group(1)) if m else None
+
+def collect_referenced_paths(db):
+    referenced = set()
+    for doc in stream_in_pages(db.collection('applications'), select_paths(['attachment', 'attachments', '첨부파일'])):
+        d = doc.to_dict()
+        for url in [d.get('attachment'), d.get('첨부파일')] + list(d.get('attachments') or []):
+            path = storage_path_from_url(url)
+            if path:
+                referenced.add(path)
+    versions = db.collection('settings').document('site_content').collection('rule_versions')
+    for doc in stream_in_pages(versions, ['files']):
+        for f in doc.to_dict().get('files', []) or []:
+            path = storage_path_from_url(f.get('url'))
+            if path:
+                referenced.add(path)
+    return referenced
+
+def claim_orphan_index(db, content_hash, sweep_started):
+    """삭제 직전에 attachments 색인을 트랜잭션으로 다시 확인하고 지웁니다.
+    참조가 남아 있거나 스윕 시작 이후 중복 업로드로 재사용(last_used_at)되었다면 False를 반환합니다."""
+    from firebase_admin import firestore
+    index_ref = db.collection('attachments').document(content_hash)
+
+    @firestore.transactional
+    def claim(transaction):
+        snap = index_ref.get(transaction=transaction)
+        if snap.exists:
+            d = snap.to_dict()
+            if d.get('refs') or (d.get('last_used_at') or 0) >= sweep_started:
+                return False
+            transaction.delete(index_ref)
+        return True
+
+    return claim(db.transaction())
+
+def sweep_orphaned_attachments(dry_run=True, grace_days=SWEEP_GRACE_DAYS, sample_limit=200):
+    """applications/rule_versions 어디에서도 참조하지 않는 uploads/ 객체를 찾아 삭제합니다.
+    업로드 직후 아직 문서에 저장되지 않은 파일을 지우지 않도록 grace_days보다 오래된 객체만 대상으로 합니다.
+    dry_run=True이면 삭제하지 않고 보고서만 반환합니다."""
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import timezone
+    from google.api_core.exceptions import PreconditionFailed
+
+    db = get_db()
+    bucket = get_bucket()
+    # 참조 목록을 만든 뒤에 재사용된 파일은 색인의 last_used_at으로 걸러냅니다.
+    sweep_started = time.time()
+    referenced = collect_referenced_paths(db)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=grace_days)
+
+    report = {'dry_run': dry_run, 'grace_days': grace_days, 'scanned': 0, 'referenced': 0,
+              'recent': 0, 'orphaned': 0, 'orphaned_bytes': 0, 'deleted': 0, 'reused': 0, 'errors': 0,
+              'samples': []}
+
+    def delete_one(blob):
+        """삭제하면 True, 실패하면 False, 스윕 도중 다시 사용되어 건너뛰면 None을 반환합니다."""
+        try:
+            content_hash = attachment_hash_from_url('/o/' + urllib.parse.quote(blob.name, safe='') + '?')
+            # 색인을 먼저 지워야 중복 업로드가 삭제될 객체의 URL을 돌려주지 않습니다.
+            if content_hash and not claim_orphan_index(db, content_hash, sweep_started):
+                return None
+            # 목록을 읽은 뒤 같은 내용이 다시 업로드되어 객체가 새로 쓰였다면 세대가 달라 삭제되지 않습니다.
+            blob.delete(if_generation_match=blob.generation)
+            return True
+        except PreconditionFailed:
+            return None
+        except Exception as e:
+            print(f"Sweep delete error ({blob.name}): {e}")
+            return False
+
+    batch = []
+    with ThreadPoolExecutor(max_workers=SWEEP_DELETE_WORKERS) as pool:
+        def flush():
+            results = list(pool.map(delete_one, batch))
+            report['deleted'] += results.count(True)
+            report['errors'] += results.count(False)
+            report['reused'] += results.count(None)
+            batch.clear()
+
+        # list_blobs는 페이지 단위로 지연 로딩되므로 전체 목록을 메모리에 올리지 않습니다.
+        for blob in bucket.list_blobs(prefix='uploads/', page_size=1000):
+            report['scanned'] += 1
+            if blob.name in referenced:
+                report['referenced'] += 1
+                continue
+            if blob.time_created and blob.time_created > cutoff:
+                report['recent'] += 1
+                continue
+            report['orphaned'] += 1
+            report['orphaned_bytes'] += blob.size or 0
+            if len(report['samples']) < sample_limit:
+                report['samples'].append(blob.name)
+            if not dry_run:
+                batch.append(blob)
+                if len(batch) >= 100:
+                    flush()
+        if batch:
+            flush()
+    return report
+
+@app.route('/admin/storage/sweep', methods=['POST'])
+def admin_storage_sweep():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error", "message": "권한이 없습니다."}), 403
+    # 실수로 삭제되지 않도록 dry_run=false를 명시해야만 실제 삭제합니다.
+    dry_run = request.form.get('dry_run', 'true').lower() != 'false'
+    try:
+        grace_days = int(request.form.get('grace_days', SWEEP_GRACE_DAYS))
+    except ValueError:
+        return jsonify({"status": "error", "message": "grace_days는 숫자여야 합니다."}), 400
+    try:
+        report = sweep_orphaned_attachments(dry_run=dry_run, grace_days=max(grace_days, 1))
+        return jsonify({"status": "success", "report": report})
+    except Exception as e:
+        print(f"Sweep Error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# --- [직원 일괄 등록/수정 (CSV/XLSX)] ---
+USER_IMPORT_FIELDS = ['이름', '직급', '부서', '이메일', '입사일', '전화번호', '비밀번호']
+USER_IMPORT_ALIASES = {
+    'employeeid': '사번', 'employee_id': '사번', 'id': '사번',
+    'name': '이름', 'username': '이름', 'position': '직급', 'rank': '직급',
+    'department': '부서', 'dept': '부서', 'email': '이메일', 'joindate': '입사일', 'join_date': '입사일',
+    'phone': '전화번호', 'password': '비밀번호'
+}
+USER_IMPORT_CHUNK = 300
+# 진행 상황은 어느 인스턴스에서든 조회할 수 있도록 import_jobs/<job_id> 문서에 기록합니다.
+# (expire_at 필드에 Firestore TTL 정책을 걸어 두면 오래된 작업 문서가 자동 삭제됩니다.)
+USER_IMPORT_PROGRESS_INTERVAL = 1.0  # 초
+
+def read_roster(file):
+    """업로드된 CSV/XLSX 명단을 문자열 DataFrame으로 읽고 컬럼명을 한글 필드명으로 맞춥니다."""
+    import pandas as pd
+    name = (file.filename or '').lower()
+    if name.endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(file, dtype=str)
+    else:
+        df = pd.read_csv(file, dtype=str, encoding='utf-8-sig')
+    df.columns = [USER_IMPORT_ALIASES.get(str(c).strip().lower().replace(' ', ''), str(c).strip()) for c in df.columns]
+    return df.fillna('').apply(lambda col: col.str.strip())
+
+def validate_roster(df):
+    """행 단위 검증 후 (사번 -> 필드 dict, 오류 목록)을 반환합니다. 행 번호는 헤더를 1행으로 본 엑셀 기준입니다."""
+    rows, errors = {}, []
+    if '사번' not in df.columns:
+        return rows, [{'row': 1, 'message': "'사번' 컬럼이 없습니다."}]
+    columns = [c for c in USER_IMPORT_FIELDS if c in df.columns]
+    for i, rec in enumerate(df.to_dict('records'), start=2):
+        sid = rec.get('사번', '')
+        if sid.endswith('.0') and sid[:-2].isdigit():
+            sid = sid[:-2]  # 엑셀 숫자 셀
+        if not sid:
+            errors.append({'row': i, 'message': '사번이 비어 있습니다.'})
+            continue
+        if sid == 'admin' or '/' in sid:
+            errors.append({'row': i, 'message': f"사용할 수 없는 사번입니다: {sid}"})
+            continue
+        if sid in rows:
+            errors.append({'row': i, 'message': f"파일 안에 중복된 사번입니다: {sid}"})
+            continue
+        fields = {c: rec[c] for c in columns if rec.get(c)}
+        if fields.get('입사일', '').endswith(' 00:00:00'):
+            fields['입사일'] = fields['입사일'][:10]
+        email = fields.get('이메일')
+        if email and not re.fullmatch(r'[^@\s]+@[^@\s]+\.[^@\s]+', email):
+            errors.append({'row': i, 'message': f"이메일 형식이 올바르지 않습니다: {email}"})
+            continue
+        fields['_row'] = i
+        rows[sid] = fields
+    return rows, errors
+
+def diff_roster(db, rows):
+    """기존 users 문서를 get_all로 묶어 읽고 신규/변경/동일 목록으로 나눕니다."""
+    creates, updates, unchanged, errors = [], [], 0, []
+    ids = list(rows)
+    for start in range(0, len(ids), USER_IMPORT_CHUNK):
+        refs = [db.collection('users').document(sid) for sid in ids[start:start + USER_IMPORT_CHUNK]]
+        for snap in db.get_all(refs):
+            fields = dict(rows[snap.id])
+            row_no = fields.pop('_row')
+            if not snap.exists:
+                if not fields.get('이름') or not fields.get('비밀번호'):
+                    errors.append({'row': row_no, 'message': f"신규 사번({snap.id})은 이름과 비밀번호가 필요합니다."})
+                    continue
+                creates.append((snap.id, dict({f: '' for f in USER_IMPORT_FIELDS}, 사번=snap.id, **fields)))
+            else:
+                current = snap.to_dict()
+                changes = {k: v for k, v in fields.items() if str(current.get(k, '')) != v}
+                if changes:
+                    updates.append((snap.id, changes))
+                else:
+                    unchanged += 1
+    return creates, updates, unchanged, errors
+
+@app.route('/admin/users/import', methods=['POST'])
+def admin_users_import():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error", "message": "권한이 없습니다."}), 403
+    file = request.files.get('roster')
+    if not file or file.filename == '':
+        return jsonify({"status": "error", "message": "명단 파일(CSV/XLSX)을 선택해 주세요."}), 400
+    dry_run = request.form.get('dry_run', 'false').lower() == 'true'
+    job_id = re.sub(r'[^\w-]', '', request.form.get('job_id', ''))[:64] or uuid.uuid4().hex
+    started = time.perf_counter()
+    db = get_db()
+    job_ref = db.collection('import_jobs').document(job_id)
+    job = {'phase': 'validating', 'total': 0, 'written': 0, 'failed': 0, 'done': False}
+    job_lock = threading.Lock()
+    last_saved = [0.0]
+
+    def save_progress(force=False):
+        # BulkWriter 콜백마다 기록하면 쓰기가 두 배가 되므로 일정 간격으로만 저장합니다.
+        now = time.monotonic()
+        if not force and now - last_saved[0] < USER_IMPORT_PROGRESS_INTERVAL:
+            return
+        last_saved[0] = now
+        try:
+            from datetime import timezone
+            job_ref.set(dict(job, expire_at=datetime.now(timezone.utc) + timedelta(days=1)))
+        except Exception as e:
+            print(f"Import progress save error: {e}")
+
+    try:
+        save_progress(force=True)
+        df = read_roster(file)
+        rows, errors = validate_roster(df)
+        creates, updates, unchanged, diff_errors = diff_roster(db, rows)
+        errors = sorted(errors + diff_errors, key=lambda e: e['row'])
+        job.update(phase='writing', total=len(creates) + len(updates))
+        save_progress(force=True)
+
+        if not dry_run and job['total']:
+            writer = db.bulk_writer()
+
+            def on_result(ref, result, bw):
+                with job_lock:
+                    job['written'] += 1
+                    save_progress()
+
+            def on_error(failure, bw):
+                if failure.attempts < 3:
+                    return True  # 재시도
+                with job_lock:
+                    job['failed'] += 1
+                    errors.append({'row': rows.get(failure.operation.reference.id, {}).get('_row'), 'message': str(failure.message)})
+                    save_progress()
+                return False
+
+            writer.on_write_result(on_result)
+            writer.on_write_error(on_error)
+            for sid, data in creates:
+                writer.create(db.collection('users').document(sid), data)
+            for sid, changes in updates:
+                writer.update(db.collection('users').document(sid), changes)
+            writer.close()
+            for sid, _ in creates:
+                forget_unknown_user(sid)
+        job.update(phase='done', done=True)
+        save_progress(force=True)
+
+        return jsonify({
+            "status": "success",
+            "job_id": job_id,
+            "dry_run": dry_run,
+            "rows": len(df),
+            "created": len(creates),
+            "updated": len(updates),
+            "unchanged": unchanged,
+            "written": job['written'],
+            "failed": job['failed'],
+            "errors": errors[:200],
+            "error_count": len(errors),
+            "took_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+    except Exception as e:
+        print(f"User import error: {e}")
+        job.update(phase='error', done=True)
+        save_progress(force=True)
+        return jsonify({"status": "error", "message": f"일괄 등록 오류: {e}"}), 500
+
+@app.route('/admin/users/import/progress')
+def admin_users_import_progress():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error"}), 403
+    job_id = re.sub(r'[^\w-]', '', request.args.get('job_id', ''))[:64]
+    snap = get_db().collection('import_jobs').document(job_id).get() if job_id else None
+    if snap is None or not snap.exists:
+        return jsonify({"status": "error", "message": "진행 정보를 찾을 수 없습니다."}), 404
+    job = snap.to_dict()
+    job.pop('expire_at', None)
+    return jsonify(dict(job, status="success"))
+
+# --- [전사 한도 사용률 리포트] ---
+def evaluate_limit_usage(df, as_of, rules=BENEFIT_LIMITS):
+    """승인 신청서 DataFrame(user_id, type, amount, apply_date)을 모든 직원 × 모든 한도 규칙에 대해 한 번에 집계합니다.
+    반환값은 직원별 행, 규칙 key별 열의 사용 금액 DataFrame입니다."""
+    import numpy as np
+    import pandas as pd
+
+    keys = [r['key'] for r in rules]
+    if df.empty:
+        return pd.DataFrame(columns=keys, dtype='int64')
+
+    dates = df['apply_date'].astype(str)
+    year = dates.str[:4].to_numpy()
+    month = pd.to_numeric(dates.str[5:7], errors='coerce').fillna(0).astype(int).to_numpy()
+    types = df['type'].astype(str).to_numpy()
+    amount = pd.to_numeric(df['amount'], errors='coerce').fillna(0).to_numpy(dtype='int64')
+
+    cur_year, cur_month = as_of.strftime('%Y'), as_of.month
+    in_year = year == cur_year
+    periods = {
+        'year': in_year,
+        'half': in_year & ((month <= 6) == (cur_month <= 6)),
+        'month': in_year & (month == cur_month),
+    }
+    # (행 수 × 규칙 수) 마스크를 만들어 금액을 곱한 뒤 직원별로 합산
+    mask = np.column_stack([np.isin(types, r['categories']) & periods[r['period']] for r in rules])
+    contrib = pd.DataFrame(amount[:, None] * mask, columns=keys)
+    return contrib.groupby(df['user_id'].astype(str).to_numpy()).sum()
+
+@app.route('/admin/limits/report')
+def admin_limits_report():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error"}), 403
+    started = time.perf_counter()
+    try:
+        threshold = float(request.args.get('threshold', 0.8))
+        as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d') if request.args.get('as_of') else datetime.now()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"잘못된 파라미터: {e}"}), 400
+    try:
+        import numpy as np
+        import pandas as pd
+        db = get_db()
+        fields = ['user_id', 'user_name', 'user_dept', 'type', 'amount', 'apply_date', '사번', '성명', '부서', '구분', '신청금액', '신청일시']
+        records = []
+        for doc in db.collection('applications').where('status', '==', '승인').select(select_paths(fields)).stream():
+            d = doc.to_dict()
+            records.append((
+                str(d.get('user_id', d.get('사번', ''))), d.get('user_name', d.get('성명', '')), d.get('user_dept', d.get('부서', '')),
+                d.get('type', d.get('구분', '')), d.get('amount', d.get('신청금액', 0)), d.get('apply_date', d.get('신청일시', ''))
+            ))
+        df = pd.DataFrame.from_records(records, columns=['user_id', 'user_name', 'user_dept', 'type', 'amount', 'apply_date'])
+        loaded_ms = (time.perf_counter() - started) * 1000
+
+        usage = evaluate_limit_usage(df, as_of)
+        limits = np.array([r['limit'] for r in BENEFIT_LIMITS], dtype='float64')
+        ratio = usage.to_numpy(dtype='float64') / limits
+        users = df.drop_duplicates('user_id', keep='last').set_index('user_id')
+
+        flagged = []
+        rows_idx, rule_idx = np.nonzero(ratio >= threshold)
+        for i, j in zip(rows_idx, rule_idx):
+            uid = usage.index[i]
+            rule = BENEFIT_LIMITS[j]
+            flagged.append({
+                'user_id': uid,
+                'user_name': users.at[uid, 'user_name'] if uid in users.index else '',
+                'user_dept': users.at[uid, 'user_dept'] if uid in users.index else '',
+                'rule': rule['key'],
+                'rule_name': rule['name'],
+                'usage': int(usage.iat[i, j]),
+                'limit': rule['limit'],
+                'ratio': round(float(ratio[i, j]), 4),
+                'level': 'over' if ratio[i, j] > 1 else ('full' if ratio[i, j] == 1 else 'near')
+            })
+        flagged.sort(key=lambda f: f['ratio'], reverse=True)
+
+        summary = [{
+            'rule': r['key'], 'rule_name': r['name'], 'limit': r['limit'], 'period': r['period'],
+            'users_with_usage': int((ratio[:, j] > 0).sum()) if len(usage) else 0,
+            'near': int(((ratio[:, j] >= threshold) & (ratio[:, j] <= 1)).sum()) if len(usage) else 0,
+            'over': int((ratio[:, j] > 1).sum()) if len(usage) else 0
+        } for j, r in enumerate(BENEFIT_LIMITS)]
+
+        if request.args.get('format') == 'xlsx':
+            output = io.BytesIO()
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                pd.DataFrame(summary).to_excel(writer, index=False, sheet_name='규칙별 요약')
+                pd.DataFrame(flagged, columns=['user_id', 'user_name', 'user_dept', 'rule_name', 'usage', 'limit', 'ratio', 'level']) \
+                    .to_excel(writer, index=False, sheet_name='한도 임박·초과')
+            output.seek(0)
+            return send_file(output, as_attachment=True,
+                             download_name=f"LOFA_limit_report_{as_of.strftime('%Y%m%d')}.xlsx",
+                             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+        return jsonify({
+            "status": "success",
+            "as_of": as_of.strftime('%Y-%m-%d'),
+            "threshold": threshold,
+            "approved_rows": len(df),
+            "employees": len(usage),
+            "summary": summary,
+            "flagged": flagged,
+            "load_ms": round(loaded_ms, 1),
+            "took_ms": round((time.perf_counter() - started) * 1000, 1)
+        })
+    except Exception as e:
+        print(f"Limit report error: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# --- [연말 복지 수혜 내역서 일괄 생성] ---
+STATEMENT_BATCH_SIZE = 25
+STATEMENT_PREFIX = 'statements'
+
+def collect_statements(db, year):
+    """승인된 신청서를 한 번만 스트리밍하면서 사번별로 묶습니다. (사번 -> 내역서 dict, 신청 건수)를 반환합니다."""
+    fields = ['app_id', 'user_id', 'user_name', 'user_dept', 'type', 'amount', 'apply_date',
+              '사번', '성명', '부서', '구분', '신청금액', '신청일시']
+    statements, count = {}, 0
+    for doc in stream_in_pages(db.collection('applications').where('status', '==', '승인'), select_paths(fields)):
+        d = normalize_application(doc.to_dict())
+        date = str(d.get('신청일시') or '')
+        uid = str(d.get('사번') or '')
+        if not uid or not date.startswith(year):
+            continue
+        try:
+            amount = int(d.get('신청금액') or 0)
+        except (TypeError, ValueError):
+            amount = 0
+        st = statements.get(uid)
+        if st is None:
+            st = statements[uid] = {'user_id': uid, 'user_name': d.get('성명', ''), 'user_dept': d.get('부서', ''), 'rows': []}
+        st['rows'].append((date, str(d.get('구분') or ''), amount, str(d.get('app_id') or doc.id)))
+        count += 1
+    return statements, count
+
+def store_statement_blob(bucket, object_path, content_type, data=None, filename=None):
+    """내역서를 Storage에 올리고 다운로드 토큰이 붙은 URL을 반환합니다."""
+    access_token = str(uuid.uuid4())
+    blob = bucket.blob(object_path)
+    blob.metadata = {"firebaseStorageDownloadTokens": access_token}
+    if filename:
+        blob.upload_from_filename(filename, content_type=content_type)
+    else:
+        blob.upload_from_string(data, content_type=content_type)
+    encoded_name = urllib.parse.quote(object_path, safe='')
+    return f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/{encoded_name}?alt=media&token={access_token}"
+
+def generate_statements(year, mode='zip', workers=None):
+    """연간 수혜 내역서를 프로세스 풀에서 렌더링하여 Storage에 저장하고 처리량/메모리 보고서를 반환합니다.
+    mode='zip'이면 하나의 압축 파일, 'per_user'이면 statements/<연도>/<사번>.xlsx 로 저장합니다."""
+    import multiprocessing
+    import tempfile
+    import zipfile
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+    import statements as statement_renderer
+
+    started = time.perf_counter()
+    db = get_db()
+    bucket = get_bucket()
+    grouped, app_count = collect_statements(db, year)
+    collected = time.perf_counter()
+
+    workers = statement_renderer.worker_count(workers)
+    issued_at = datetime.now().strftime('%Y-%m-%d')
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    items = list(grouped.values())
+    batches = [items[i:i + STATEMENT_BATCH_SIZE] for i in range(0, len(items), STATEMENT_BATCH_SIZE)]
+    report = {'year': year, 'mode': mode, 'workers': workers, 'employees': len(items), 'applications': app_count,
+              'files': 0, 'bytes': 0, 'errors': 0, 'failed_users': [], 'worker_peak_rss_kb': 0}
+
+    tmp = tempfile.NamedTemporaryFile(suffix='.zip', delete=False) if mode == 'zip' else None
+    archive = zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) if tmp else None
+    uploads = []
+    try:
+        # Firestore(gRPC) 스레드가 살아 있는 프로세스를 fork하면 멈출 수 있으므로 spawn으로 워커를 띄웁니다.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool, \
+                ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as uploader:
+            futures = {pool.submit(statement_renderer.render_batch, b, year, issued_at): b for b in batches}
+            for future in as_completed(futures):
+                try:
+                    results, worker_rss = future.result()
+                except Exception as e:
+                    # 배치 단위로 실패하므로 그 배치에 속한 직원 모두가 누락됩니다.
+                    failed = [st['user_id'] for st in futures[future]]
+                    print(f"Statement render error ({len(failed)} statements): {e}")
+                    report['errors'] += len(failed)
+                    report['failed_users'].extend(failed)
+                    continue
+                report['worker_peak_rss_kb'] = max(report['worker_peak_rss_kb'], worker_rss)
+                for uid, data in results:
+                    report['files'] += 1
+                    report['bytes'] += len(data)
+                    if archive:
+                        name = re.sub(r'[\\/:*?"<>|\s]', '', f"{uid}_{grouped[uid]['user_name']}")
+                        archive.writestr(f"{year}/{name}.xlsx", data)
+                    else:
+                        uploads.append((uid, uploader.submit(
+                            store_statement_blob, bucket, f"{STATEMENT_PREFIX}/{year}/{uid}.xlsx",
+                            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', data)))
+            for uid, f in uploads:
+                try:
+                    f.result()
+                except Exception as e:
+                    print(f"Statement upload error ({uid}): {e}")
+                    report['errors'] += 1
+                    report['failed_users'].append(uid)
+        rendered = time.perf_counter()
+
+        if archive:
+            archive.close()
+            tmp.close()
+            report['zip_bytes'] = os.path.getsize(tmp.name)
+            report['url'] = store_statement_blob(bucket, f"{STATEMENT_PREFIX}/{year}/LOFA_statements_{year}_{stamp}.zip",
+                                                 'application/zip', filename=tmp.name)
+        else:
+            report['prefix'] = f"{STATEMENT_PREFIX}/{year}/"
+    finally:
+        if archive:
+            archive.close()  # tmp보다 먼저 닫아야 오류 경로에서 ZipFile이 닫힌 파일에 쓰지 않습니다.
+        if tmp:
+            tmp.close()
+            os.unlink(tmp.name)
+
+    finished = time.perf_counter()
+    report.update({
+        'collect_ms': round((collected - started) * 1000, 1),
+        'render_ms': round((rendered - collected) * 1000, 1),
+        'write_ms': round((finished - rendered) * 1000, 1),
+        'took_ms': round((finished - started) * 1000, 1),
+        'statements_per_sec': round(report['files'] / (finished - collected), 1) if finished > collected else 0.0,
+        'peak_rss_kb': statement_renderer.peak_rss_kb()
+    })
+    return report
+
+@app.route('/admin/statements/generate', methods=['POST'])
+def admin_generate_statements():
+    if session.get('user_id') != 'admin':
+        return jsonify({"status": "error", "message": "권한이 없습니다."}), 403
+    year = request.form.get('year') or datetime.now().strftime('%Y')
+    mode = request.form.get('mode', 'zip')
+    if not re.fullmatch(r'\d{4}', year) or mode not in ('zip', 'per_user'):
+        return jsonify({"status": "error", "message": "year는 4자리 연도, mode는 zip 또는 per_user여야 합니다."}), 400
+    try:
+        workers = int(request.form['workers']) if request.form.get('workers') else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "workers는 숫자여야 합니다."}), 400
+    try:
+        report = generate_statements(year, mode=mode, workers=workers)
+        return jsonify({"status": "success", "report": report})
+    except Exception as e:
+        print(f"Statement generation error: {e}")
+        return jsonify({"status": "error", "message": f"내역서 생성 오류: {e}"}), 500
+
 # --- [엑셀 다운로드 기능 개선] ---
 @app.route('/download_excel')
 def download_excel():
@@ -791,19 +2279,7 @@ def download_excel():
         docs = db.collection('applications').stream()
         all_apps = []
         for doc in docs:
-            d = doc.to_dict()
-            # 하위 호환성을 위한 데이터 매핑
-            if '신청일시' not in d and 'apply_date' in d: d['신청일시'] = d['apply_date']
-            if '구분' not in d and 'type' in d: d['구분'] = d['type']
-            if '상태' not in d and 'status' in d: d['상태'] = d['status']
-            if '신청금액' not in d and 'amount' in d: d['신청금액'] = d['amount']
-            if '사번' not in d and 'user_id' in d: d['사번'] = d['user_id']
-            if '성명' not in d and 'user_name' in d: d['성명'] = d['user_name']
-            if '부서' not in d and 'user_dept' in d: d['부서'] = d['user_dept']
-            if '직급' not in d and 'user_rank' in d: d['직급'] = d['user_rank']
-            if '입사일' not in d and 'join_date' in d: d['입사일'] = d['join_date']
-            if '첨부파일' not in d and 'attachment' in d: d['첨부파일'] = d['attachment']
-            if '반려의견' not in d and 'reject_reason' in d: d['반려의견'] = d['reject_reason']
+            d = normalize_application(doc.to_dict())
 
             # 원본 데이터(raw_data)가 있으면 그것을 기반으로 정리
             row = {
@@ -881,6 +2357,7 @@ def signup_process():
         '전화번호': request.form.get('phone')
     }
     db.collection('users').document(sid).set(new_user)
+    forget_unknown_user(sid)
     return jsonify({"status": "success"})
 
 @app.route('/logout')
@@ -943,13 +2420,11 @@ def update_settings():
             content = request.form.get('rules', '')
             files = request.files.getlist('rules_files')
             
-            uploaded_files = []
-            for f in files:
-                if f and f.filename != '':
-                    f_url = upload_file_to_storage(f, "admin", "system", f"rules_{v_name}")
-                    uploaded_files.append({"name": f.filename, "url": f_url})
-            
             v_id = str(int(datetime.now().timestamp()))
+            files = [f for f in files if f and f.filename != '']
+            urls = upload_files_to_storage(files, "admin", "system", f"rules_{v_name}")
+            uploaded_files = [{"name": f.filename, "url": f_url} for f, f_url in zip(files, urls)]
+            
             db.collection('settings').document('site_content').collection('rule_versions').document(v_id).set({
                 "version_id": v_id,
                 "version_name": v_name,
@@ -957,6 +2432,7 @@ def update_settings():
                 "files": uploaded_files,
                 "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             })
+            add_attachment_refs(urls, f"rule_versions/{v_id}")
             return jsonify({"status": "success", "message": f"새 버전({v_name})이 등록되었습니다."})
 
     except Exception as e:
@@ -971,7 +2447,12 @@ def delete_rules_version():
         return jsonify({"status": "error", "message": "version_id가 필요합니다."})
     try:
         db = get_db()
-        db.collection('settings').document('site_content').collection('rule_versions').document(version_id).delete()
+        v_ref = db.collection('settings').document('site_content').collection('rule_versions').document(version_id)
+        v_doc = v_ref.get()
+        v_ref.delete()
+        if v_doc.exists:
+            for f in v_doc.to_dict().get('files', []):
+                release_attachment_ref(f.get('url'), f"rule_versions/{version_id}")
         return jsonify({"status": "success"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
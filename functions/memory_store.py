@@ -0,0 +1,449 @@
+"""리플레이/부하 측정용 인메모리 Firestore·Storage 대체 구현.
+
+app.py가 사용하는 범위(컬렉션/문서 CRUD, 단순 where/order_by/limit 쿼리, 페이지 조회,
+ArrayUnion/ArrayRemove/DELETE_FIELD 같은 필드 변환)만 흉내 냅니다.
+app._db / app._bucket 에 주입해서 사용합니다.
+"""
+import copy
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+
+try:
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+except ImportError:  # firebase-admin 없이 실행하는 경우
+    class PreconditionFailed(Exception):
+        pass
+
+    class NotFound(Exception):
+        pass
+
+
+def _split_field_path(path):
+    """'raw_data.`필드`' 형태의 필드 경로를 구성 요소 목록으로 나눕니다."""
+    parts, buf, quoted = [], '', False
+    for ch in path:
+        if ch == '`':
+            quoted = not quoted
+        elif ch == '.' and not quoted:
+            parts.append(buf)
+            buf = ''
+        else:
+            buf += ch
+    parts.append(buf)
+    return parts
+
+
+_SIMPLE_FIELD = re.compile(r'[_a-zA-Z][_a-zA-Z0-9]*')
+
+
+def _parse_select_path(path):
+    """실제 클라이언트(split_field_path)와 같이 검사합니다.
+    백틱으로 감싸지 않은 구성 요소는 영문/숫자/_ 로만 이루어져야 하며, 아니면 ValueError를 냅니다."""
+    parts, i = [], 0
+    while True:
+        if path.startswith('`', i):
+            buf, i = '', i + 1
+            while i < len(path) and path[i] != '`':
+                if path[i] == '\\' and i + 1 < len(path):
+                    i += 1
+                buf += path[i]
+                i += 1
+            if i >= len(path):
+                raise ValueError(f"Path {path} not consumed")
+            parts.append(buf)
+            i += 1
+        else:
+            m = _SIMPLE_FIELD.match(path, i)
+            if not m:
+                raise ValueError(f"Path {path} not consumed")
+            parts.append(m.group())
+            i = m.end()
+        if i == len(path):
+            return parts
+        if path[i] != '.':
+            raise ValueError(f"Path {path} not consumed")
+        i += 1
+
+
+def _project(data, paths):
+    out = {}
+    for parts in paths:
+        src, dst = data, out
+        for p in parts[:-1]:
+            if not isinstance(src.get(p), dict):
+                break
+            src = src[p]
+            dst = dst.setdefault(p, {})
+        else:
+            if parts[-1] in src:
+                dst[parts[-1]] = src[parts[-1]]
+    return out
+
+
+def _is_delete(value):
+    return type(value).__name__ == 'Sentinel' and 'delete' in repr(value).lower()
+
+
+def _is_server_timestamp(value):
+    return type(value).__name__ == 'Sentinel' and 'timestamp' in repr(value).lower()
+
+
+def _apply_value(current, value):
+    kind = type(value).__name__
+    if kind == 'ArrayUnion':
+        current = list(current or [])
+        return current + [v for v in value.values if v not in current]
+    if kind == 'ArrayRemove':
+        return [v for v in (current or []) if v not in value.values]
+    if kind == 'Increment':
+        return (current or 0) + value.value
+    if _is_server_timestamp(value):
+        return datetime.now(timezone.utc)
+    return copy.deepcopy(value)
+
+
+def _apply_fields(data, fields, nested_paths):
+    for key, value in fields.items():
+        parts = _split_field_path(key) if nested_paths else [key]
+        target = data
+        for p in parts[:-1]:
+            if not isinstance(target.get(p), dict):
+                target[p] = {}
+            target = target[p]
+        if _is_delete(value):
+            target.pop(parts[-1], None)
+        else:
+            target[parts[-1]] = _apply_value(target.get(parts[-1]), value)
+
+
+def _field_value(data, path):
+    if path == '__name__':
+        return data.get('__name__')
+    cur = data
+    for p in _split_field_path(path):
+        if not isinstance(cur, dict) or p not in cur:
+            return None
+        cur = cur[p]
+    return cur
+
+
+def _sort_key(value):
+    return (value is None, value if value is not None else '')
+
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    'array_contains_any': lambda a, b: isinstance(a, list) and any(v in a for v in b),
+}
+
+
+class MemorySnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _field_value(self._data or {}, field)
+
+
+class MemoryDocument:
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def get(self, field_paths=None, transaction=None):
+        with self._store.lock:
+            return MemorySnapshot(self, copy.deepcopy(self._store.docs.get(self.path)))
+
+    def set(self, data, merge=False):
+        with self._store.lock:
+            current = self._store.docs.get(self.path) if merge else None
+            current = copy.deepcopy(current) if current else {}
+            _apply_fields(current, data, nested_paths=False)
+            self._store.docs[self.path] = current
+
+    def create(self, data):
+        with self._store.lock:
+            if self.path in self._store.docs:
+                raise ValueError(f"Document already exists: {self.path}")
+        self.set(data)
+
+    def update(self, data):
+        with self._store.lock:
+            if self.path not in self._store.docs:
+                raise NotFound(f"No document to update: {self.path}")
+            _apply_fields(self._store.docs[self.path], data, nested_paths=True)
+
+    def delete(self):
+        with self._store.lock:
+            self._store.docs.pop(self.path, None)
+
+    def collection(self, name):
+        return MemoryCollection(self._store, f"{self.path}/{name}")
+
+
+class MemoryQuery:
+    def __init__(self, store, path, filters=(), orders=(), limit=None, after=None, projection=None):
+        self._store = store
+        self._path = path
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._after = after
+        self._projection = projection
+
+    def _copy(self, **changes):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit, after=self._after,
+                    projection=self._projection)
+        args.update(changes)
+        return MemoryQuery(self._store, self._path, **args)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + [(field, op, value)])
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + [(field, direction == 'DESCENDING')])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, field_paths):
+        return self._copy(projection=[_parse_select_path(p) for p in field_paths])
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    def _matching(self):
+        prefix = self._path + '/'
+        with self._store.lock:
+            rows = []
+            for path, data in self._store.docs.items():
+                if not path.startswith(prefix) or '/' in path[len(prefix):]:
+                    continue
+                row = dict(data, __name__=path[len(prefix):])
+                if all(_OPS[op](_field_value(row, f), v) for f, op, v in self._filters):
+                    rows.append((path, copy.deepcopy(data), row))
+        orders = self._orders or [('__name__', False)]
+        for field, desc in reversed(orders):
+            rows.sort(key=lambda r: _sort_key(_field_value(r[2], field)), reverse=desc)
+        if self._after is not None:
+            ids = [p for p, _, _ in rows]
+            after_path = self._after.reference.path
+            rows = rows[ids.index(after_path) + 1:] if after_path in ids else rows
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._projection is not None:
+            rows = [(p, _project(d, self._projection), r) for p, d, r in rows]
+        return [MemorySnapshot(MemoryDocument(self._store, p), d) for p, d, _ in rows]
+
+    def stream(self):
+        return iter(self._matching())
+
+    def get(self):
+        return self._matching()
+
+    def on_snapshot(self, callback):
+        # 리플레이에서는 실시간 리스너를 쓰지 않으므로 등록만 받고 아무 이벤트도 보내지 않습니다.
+        class _Watch:
+            def unsubscribe(self):
+                pass
+        return _Watch()
+
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, store, path):
+        super().__init__(store, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        return MemoryDocument(self._store, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+
+class MemoryFirestore:
+    """firestore.client()와 같은 모양의 인메모리 클라이언트."""
+
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.RLock()
+
+    def collection(self, path):
+        return MemoryCollection(self, path)
+
+    def get_all(self, references, field_paths=None):
+        for ref in references:
+            yield ref.get()
+
+    def bulk_writer(self):
+        return MemoryBulkWriter()
+
+    def transaction(self):
+        return MemoryTransaction()
+
+
+class MemoryTransaction:
+    """쓰기를 즉시 반영하는 단순 트랜잭션. 인메모리 저장소는 요청을 순서대로 처리하므로 충돌 재시도가 없습니다."""
+
+    def set(self, reference, data, merge=False):
+        reference.set(data, merge=merge)
+
+    def update(self, reference, data):
+        reference.update(data)
+
+    def delete(self, reference):
+        reference.delete()
+
+
+class MemoryBulkWriter:
+    """firestore BulkWriter와 같은 인터페이스로 즉시 기록하고 결과 콜백을 호출합니다."""
+
+    def __init__(self):
+        self._on_result = None
+        self._on_error = None
+
+    def on_write_result(self, callback):
+        self._on_result = callback
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def _run(self, reference, op, *args):
+        operation = MemoryBulkWriteOperation(reference)
+        while True:
+            operation.attempts += 1
+            try:
+                getattr(reference, op)(*args)
+            except Exception as e:
+                # 실제 BulkWriter처럼 (failure, bulk_writer)로 호출하고, True를 반환하면 재시도합니다.
+                failure = MemoryBulkWriteFailure(operation, e)
+                if self._on_error and self._on_error(failure, self):
+                    continue
+                return
+            if self._on_result:
+                self._on_result(reference, None, self)
+            return
+
+    def create(self, reference, data):
+        self._run(reference, 'create', data)
+
+    def set(self, reference, data, merge=False):
+        self._run(reference, 'set', data, merge)
+
+    def update(self, reference, data):
+        self._run(reference, 'update', data)
+
+    def delete(self, reference):
+        self._run(reference, 'delete')
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryBulkWriteOperation:
+    def __init__(self, reference):
+        self.reference = reference
+        self.attempts = 0
+
+
+class MemoryBulkWriteFailure:
+    def __init__(self, operation, error):
+        self.operation = operation
+        self.code = type(error).__name__
+        self.message = str(error)
+
+    @property
+    def attempts(self):
+        return self.operation.attempts
+
+
+class MemoryBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+        self.content_type = None
+        self.size = None
+        self.time_created = None
+        self.generation = None
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.bucket.lock:
+            if if_generation_match == 0 and self.name in self.bucket.objects:
+                raise PreconditionFailed(f"Object exists: {self.name}")
+            if if_generation_match not in (None, 0) and self._current_generation() != if_generation_match:
+                raise PreconditionFailed(f"Generation mismatch: {self.name}")
+            self.content_type = content_type
+            self.size = len(data)
+            self.time_created = datetime.now(timezone.utc)
+            self.bucket.generation += 1
+            self.generation = self.bucket.generation
+            self.bucket.objects[self.name] = (bytes(data), self)
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, 'rb') as f:
+            self.upload_from_string(f.read(), content_type=content_type, **kwargs)
+
+    def download_as_bytes(self):
+        return self.bucket.objects[self.name][0]
+
+    def patch(self):
+        pass
+
+    def reload(self):
+        stored = self.bucket.objects[self.name][1]
+        self.metadata = stored.metadata
+        self.content_type = stored.content_type
+        self.size = stored.size
+        self.time_created = stored.time_created
+        self.generation = stored.generation
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def _current_generation(self):
+        stored = self.bucket.objects.get(self.name)
+        return stored[1].generation if stored else None
+
+    def delete(self, if_generation_match=None):
+        with self.bucket.lock:
+            if self.name not in self.bucket.objects:
+                raise NotFound(f"No such object: {self.name}")
+            if if_generation_match is not None and self._current_generation() != if_generation_match:
+                raise PreconditionFailed(f"Generation mismatch: {self.name}")
+            self.bucket.objects.pop(self.name, None)
+
+
+class MemoryBucket:
+    def __init__(self, name='memory-bucket'):
+        self.name = name
+        self.objects = {}
+        self.generation = 0
+        self.lock = threading.RLock()
+
+    def blob(self, name):
+        return MemoryBlob(self, name)
+
+    def list_blobs(self, prefix='', page_size=None, **kwargs):
+        with self.lock:
+            blobs = [b for n, (_, b) in sorted(self.objects.items()) if n.startswith(prefix)]
+        return iter(blobs)
@@ -0,0 +1,216 @@
+"""캡처한 트래픽 로그(JSONL)를 인메모리 저장소를 대상으로 재생하여 라우트별 지연/처리량을 측정합니다.
+
+로그 수집: 서버 실행 시 TRAFFIC_CAPTURE_PATH=/tmp/capture.jsonl 환경 변수를 설정합니다.
+재생 예시:
+    python replay_traffic.py /tmp/capture.jsonl --speedup 20
+    python replay_traffic.py /tmp/capture.jsonl --speedup 0 --json   # 대기 없이 최대 속도
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+
+from memory_store import MemoryBucket, MemoryFirestore
+
+SEED_PASSWORD = 'replay-pass'
+CATEGORIES = ['주택지원', '복지연금', '의료비지원', '생활복지지원', '근로자가족문화활동비', '대부신청', '경조비지원',
+              '정기예방접종', '장학금지원', '다자녀가정지원', '선진산업시찰', '모성보호지원', '위로금지원']
+# 실시간 스트림처럼 끝나지 않는 요청은 재생하지 않습니다.
+SKIP_RULES = {'/admin/pending/stream'}
+# 이전에 수집한 로그에 남아 있을 수 있는 진단용 파라미터 (재생 요청이 프로파일링되지 않도록 제거)
+SKIP_PARAMS = {'_profile'}
+# 값이 정해진 선택지 중 하나여야 의미 있는 동작을 하는 필드
+FIELD_CHOICES = {
+    'type': CATEGORIES,
+    'status': ['승인', '반려'],
+    'action': ['cancel'],
+    'mode': ['notice'],
+}
+
+
+def seed_store(db, users, apps):
+    """재생에 필요한 사용자/신청서 데이터를 만들어 둡니다."""
+    year = datetime.now().strftime('%Y')
+    user_ids = [f"R{i:05d}" for i in range(users)]
+    db.collection('users').document('admin').set({'사번': 'admin', '비밀번호': SEED_PASSWORD, '이름': '관리자'})
+    for uid in user_ids:
+        db.collection('users').document(uid).set({
+            '사번': uid, '비밀번호': SEED_PASSWORD, '이름': f"사용자{uid}", '부서': '리플레이', '직급': '사원'
+        })
+    app_ids = []
+    for i in range(apps):
+        uid = random.choice(user_ids)
+        app_id = str(1_000_000_000_000 + i)
+        cat = random.choice(CATEGORIES)
+        status = random.choice(['대기', '승인', '승인', '반려'])
+        date = f"{year}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d} 09:00:00"
+        amount = random.choice([30000, 50000, 100000, 250000])
+        db.collection('applications').document(app_id).set({
+            'app_id': app_id, 'user_id': uid, 'user_name': f"사용자{uid}", 'user_dept': '리플레이',
+            'type': cat, 'amount': amount, 'status': status, 'apply_date': date, 'detail': '리플레이 데이터',
+            '사번': uid, '성명': f"사용자{uid}", '구분': cat, '신청금액': amount, '상태': status, '신청일시': date,
+            'raw_data': {}
+        })
+        app_ids.append(app_id)
+    return user_ids, app_ids
+
+
+def synth_value(key, shape, ctx):
+    if key == 'employeeId':
+        return ctx['user_id']
+    if key == 'password':
+        return SEED_PASSWORD
+    if key == 'app_id':
+        return random.choice(ctx['app_ids']) if ctx['app_ids'] else ''
+    if key in FIELD_CHOICES:
+        return random.choice(FIELD_CHOICES[key])
+    kind = shape.get('t')
+    if kind == 'flag':
+        return shape.get('v', 'on')
+    if kind == 'num':
+        return str(10 ** max(shape.get('len', 1) - 1, 0))
+    if kind == 'secret':
+        return 'x' * 8
+    return 'x' * shape.get('len', 1)
+
+
+def build_url(record):
+    rule = record.get('rule')
+    if not rule:
+        return None
+    view_args = record.get('view_args') or {}
+    url = re.sub(r'<(?:[^:<>]+:)?([^<>]+)>', lambda m: str(view_args.get(m.group(1), '\0')), rule)
+    return None if '\0' in url else url
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def replay(records, speedup, user_ids, app_ids, client_for_role, quiet=True):
+    stats = {}
+    t0 = records[0]['ts'] if records else 0
+    started = time.perf_counter()
+    sink = io.StringIO()
+    for record in records:
+        url = build_url(record)
+        if url is None or record['rule'] in SKIP_RULES:
+            continue
+        if speedup > 0:
+            delay = (record['ts'] - t0) / speedup - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        ctx = {'user_id': random.choice(user_ids), 'app_ids': app_ids}
+        client = client_for_role(record.get('role', 'anon'), ctx['user_id'])
+        query = {k: synth_value(k, v, ctx) for k, v in (record.get('query') or {}).items() if k not in SKIP_PARAMS}
+        data = {k: synth_value(k, v, ctx) for k, v in (record.get('form') or {}).items() if k not in SKIP_PARAMS}
+        for f in record.get('files') or []:
+            payload = os.urandom(min(int(f.get('size') or 1024), 8 * 1024 * 1024))
+            data.setdefault(f['field'], []).append((io.BytesIO(payload), f"replay{f.get('ext', '')}"))
+
+        with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            t = time.perf_counter()
+            resp = client.open(url, method=record['method'], query_string=query, data=data or None)
+            elapsed = (time.perf_counter() - t) * 1000
+            resp.close()
+        sink.seek(0)
+        sink.truncate()
+
+        s = stats.setdefault(record['rule'], {'ms': [], 'captured_ms': [], 'errors': 0, 'bytes': 0})
+        s['ms'].append(elapsed)
+        s['captured_ms'].append(record.get('ms') or 0)
+        s['bytes'] += len(resp.get_data())
+        if resp.status_code >= 500:
+            s['errors'] += 1
+    return stats, time.perf_counter() - started
+
+
+def summarize(stats, wall):
+    total = sum(len(s['ms']) for s in stats.values())
+    routes = []
+    for rule, s in sorted(stats.items(), key=lambda kv: -len(kv[1]['ms'])):
+        routes.append({
+            'rule': rule,
+            'count': len(s['ms']),
+            'errors': s['errors'],
+            'p50_ms': round(percentile(s['ms'], 50), 2),
+            'p95_ms': round(percentile(s['ms'], 95), 2),
+            'p99_ms': round(percentile(s['ms'], 99), 2),
+            'mean_ms': round(sum(s['ms']) / len(s['ms']), 2),
+            'captured_p50_ms': round(percentile(s['captured_ms'], 50), 2),
+            'req_per_sec': round(len(s['ms']) / wall, 2) if wall else 0.0,
+            'avg_bytes': int(s['bytes'] / len(s['ms'])),
+        })
+    return {'total_requests': total, 'wall_seconds': round(wall, 3),
+            'req_per_sec': round(total / wall, 2) if wall else 0.0, 'routes': routes}
+
+
+def print_report(report):
+    print(f"총 {report['total_requests']}건 / {report['wall_seconds']}초 / {report['req_per_sec']} req/s")
+    header = f"{'route':<32}{'count':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'capt.p50':>10}{'req/s':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in report['routes']:
+        print(f"{r['rule']:<32}{r['count']:>7}{r['errors']:>5}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['captured_p50_ms']:>10}{r['req_per_sec']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LOFA 트래픽 로그 재생기')
+    parser.add_argument('log', help='TRAFFIC_CAPTURE_PATH로 수집한 JSONL 파일')
+    parser.add_argument('--speedup', type=float, default=10.0, help='원래 요청 간격을 몇 배 빠르게 재생할지 (0이면 대기 없음)')
+    parser.add_argument('--seed-users', type=int, default=200)
+    parser.add_argument('--seed-apps', type=int, default=2000)
+    parser.add_argument('--keep-throttle', action='store_true', help='로그인 시도 제한을 그대로 적용 (기본은 해제)')
+    parser.add_argument('--verbose', action='store_true', help='앱의 print 출력을 숨기지 않음')
+    parser.add_argument('--json', action='store_true', help='결과를 JSON으로 출력')
+    args = parser.parse_args(argv)
+
+    with open(args.log, encoding='utf-8') as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda r: r.get('ts', 0))
+
+    import app as lofa
+    lofa._db = MemoryFirestore()
+    lofa._bucket = MemoryBucket('replay-bucket')
+    lofa._firebase_initialized = True
+    lofa.TRAFFIC_CAPTURE_PATH = ''
+    lofa.app.config['SESSION_COOKIE_SECURE'] = False
+    if not args.keep_throttle:
+        # 재생 요청은 모두 같은 IP에서 오므로, 제한을 두면 실제와 다른 429가 섞입니다.
+        lofa.LOGIN_IP_BUCKET = lofa.LOGIN_USER_BUCKET = (10 ** 9, 10 ** 9)
+
+    user_ids, app_ids = seed_store(lofa._db, args.seed_users, args.seed_apps)
+    clients = {}
+
+    def client_for_role(role, user_id):
+        client = clients.get(role)
+        if client is None:
+            client = clients[role] = lofa.app.test_client()
+        if role != 'anon':
+            sid = 'admin' if role == 'admin' else user_id
+            with client.session_transaction() as sess:
+                sess.update({'user_id': sid, 'user_name': f"사용자{sid}", 'user_dept': '리플레이'})
+        return client
+
+    stats, wall = replay(records, args.speedup, user_ids, app_ids, client_for_role, quiet=not args.verbose)
+    report = summarize(stats, wall)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
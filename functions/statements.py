@@ -0,0 +1,92 @@
+"""연말 복지 수혜 내역서(XLSX) 렌더링.
+
+프로세스 풀 워커에서 실행되므로 Flask/Firebase를 import하지 않고 openpyxl만 사용합니다.
+app.py의 /admin/statements/generate 에서 호출합니다.
+"""
+import io
+import os
+
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+HEADER_FILL = PatternFill('solid', fgColor='DDE7F5')
+BOLD = Font(bold=True)
+THIN = Side(style='thin', color='999999')
+BOX = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
+
+
+def _table(ws, start_row, header, rows, widths):
+    for col, title in enumerate(header, start=1):
+        cell = ws.cell(row=start_row, column=col, value=title)
+        cell.font = BOLD
+        cell.fill = HEADER_FILL
+        cell.border = BOX
+        cell.alignment = Alignment(horizontal='center')
+    for r, values in enumerate(rows, start=start_row + 1):
+        for col, value in enumerate(values, start=1):
+            cell = ws.cell(row=r, column=col, value=value)
+            cell.border = BOX
+            if isinstance(value, int):
+                cell.number_format = '#,##0'
+    for col, width in enumerate(widths, start=1):
+        ws.column_dimensions[chr(64 + col)].width = max(ws.column_dimensions[chr(64 + col)].width or 0, width)
+    return start_row + len(rows) + 1
+
+
+def render_statement(statement, year, issued_at):
+    """직원 한 명의 승인 내역으로 XLSX 내역서를 만들어 바이트로 반환합니다.
+    statement: {'user_id', 'user_name', 'user_dept', 'rows': [(신청일시, 구분, 금액, 신청번호), ...]}"""
+    rows = sorted(statement['rows'])
+    totals = {}
+    for _, category, amount, _ in rows:
+        totals[category] = totals.get(category, 0) + amount
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = f"{year}년 수혜내역"
+    ws['A1'] = f"{year}년 복지 수혜 내역서"
+    ws['A1'].font = Font(bold=True, size=14)
+    ws.append([])
+    for label, value in [('사번', statement['user_id']), ('성명', statement.get('user_name', '')),
+                         ('부서', statement.get('user_dept', '')), ('발급일', issued_at)]:
+        ws.append([label, value])
+        ws.cell(row=ws.max_row, column=1).font = BOLD
+
+    next_row = _table(ws, ws.max_row + 2, ['구분', '건수', '수혜금액'],
+                      [(c, sum(1 for r in rows if r[1] == c), t) for c, t in sorted(totals.items())]
+                      + [('합계', len(rows), sum(totals.values()))],
+                      [22, 8, 14])
+    ws.cell(row=next_row - 1, column=1).font = BOLD
+    _table(ws, next_row + 1, ['신청일시', '구분', '수혜금액', '신청번호'],
+           [(d, c, a, app_id) for d, c, a, app_id in rows], [22, 22, 14, 18])
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def render_batch(batch, year, issued_at):
+    """여러 명의 내역서를 한 번에 렌더링합니다 (프로세스 간 전송 횟수를 줄이기 위함).
+    [(user_id, xlsx 바이트), ...]와 워커 프로세스의 최대 RSS(KB)를 반환합니다."""
+    results = [(s['user_id'], render_statement(s, year, issued_at)) for s in batch]
+    return results, peak_rss_kb()
+
+
+def peak_rss_kb():
+    """현재 프로세스의 최대 RSS(KB). spawn으로 뜬 워커에서도 부모 값이 섞이지 않도록 VmHWM을 우선 사용합니다."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:  # Windows
+        return 0
+
+
+def worker_count(requested=None):
+    return max(1, min(requested or os.cpu_count() or 1, 8))
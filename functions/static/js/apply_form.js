@@ -0,0 +1,51 @@
+// 신청서 공통 스크립트: 은행 선택, 계좌 문자열 조합/복원, 금액 입력 포맷, 제출
+const BANKS=['KB국민은행','신한은행','우리은행','하나은행','NH농협은행','IBK기업은행','카카오뱅크','토스뱅크','SC제일은행','씨티은행','대구은행','부산은행','광주은행','전북은행','경남은행','제주은행','KDB산업은행','수협은행','새마을금고','신협','우체국','iM뱅크(구DGB)','기타'];
+
+function initBankSelect(){
+  const sel=document.getElementById('bankSel');
+  if(!sel)return;
+  BANKS.forEach(b=>{const o=document.createElement('option');o.value=b;o.textContent=b;sel.appendChild(o);});
+}
+
+function syncAcct(){
+  const b=(document.getElementById('bankSel')||{value:''}).value;
+  const n=(document.getElementById('acctNum')||{value:''}).value;
+  const h=(document.getElementById('acctHolder')||{value:''}).value;
+  const hidden=document.getElementById('account');
+  const cleanAcct=n.replace(/[^0-9]/g,'');
+  if(hidden)hidden.value=(b&&cleanAcct&&h)?`${b}/${cleanAcct}/${h.trim()}`:'';
+}
+
+function loadAcct(str){
+  if(!str)return;
+  const p=str.split('/');
+  const sel=document.getElementById('bankSel');
+  if(sel&&p[0]){sel.value=p[0];if(!sel.value){const o=new Option(p[0],p[0],true,true);sel.appendChild(o);sel.value=p[0];}}
+  const num=document.getElementById('acctNum');if(num&&p[1])num.value=p[1];
+  const holder=document.getElementById('acctHolder');if(holder&&p[2])holder.value=p[2];
+  syncAcct();
+}
+
+function initAmt(){
+  const disp=document.getElementById('amtDisp');
+  const hidden=document.getElementById('amount');
+  if(!disp||!hidden)return;
+  const v=parseInt(hidden.value||'0');
+  if(v)disp.value=v.toLocaleString('ko-KR');
+  disp.addEventListener('input',function(){
+    const r=this.value.replace(/[^0-9]/g,'');
+    this.value=r?parseInt(r).toLocaleString('ko-KR'):'';
+    hidden.value=r||'0';
+  });
+}
+
+async function doSubmit(formEl){
+  const fd=new FormData(formEl);
+  try{
+    const res=await fetch('/submit',{method:'POST',body:fd});
+    if(!res.ok)throw new Error(`서버 오류(${res.status})`);
+    const r=await res.json();
+    if(r.status==='success'){alert(r.message||'신청이 완료되었습니다.');window.location.href='/my_status';}
+    else alert('오류: '+r.message);
+  }catch(err){alert('제출 오류: '+err.message);}
+}